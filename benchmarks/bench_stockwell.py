@@ -0,0 +1,359 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+bench_stockwell.py.
+
+Benchmark suite for the Stockwell project.
+
+Measure the runtime and the peak memory of :func:`stockwell.st.st`,
+:func:`stockwell.st.ist`, :func:`stockwell.st.hilbert` and
+:func:`stockwell.sine.sine_taper`, over a matrix of data lengths (powers of
+two, primes and 5-smooth numbers), frequency ranges, window types and
+thread counts, and write the results to a JSON file. The bank of sine tapers
+computed in a single call by :func:`stockwell.sine.sine_tapers` is also
+measured.
+
+Usage::
+
+    python benchmarks/bench_stockwell.py -o base.json
+    python benchmarks/bench_stockwell.py -o new.json --compare base.json
+
+With ``--compare``, the results are compared to those of a previous run
+(e.g., on another commit), and the exit status is 1 if any benchmark is
+slower than the baseline by more than ``--threshold``.
+
+Benchmarks which need an API that is missing from the installed version of
+stockwell (e.g., ``nthreads`` or :func:`stockwell.sine.sine_tapers`, on an
+older commit) are skipped, so that a baseline can be recorded on any
+commit. Any other error stops the run. The results are written after each
+benchmark, so that they are kept if the run is interrupted. With
+``--compare``, the benchmarks of the baseline which are skipped or missing
+in the new run are also reported, and make the exit status 1.
+
+The runtime is the minimum (and the median) over ``--repeat`` calls, after
+one warm-up call which creates the FFTW plans. The peak memory is the
+largest amount of memory allocated through Python during one call, as
+reported by :mod:`tracemalloc`: it includes the NumPy arrays, but not the
+FFTW plans and the buffers allocated by the C library.
+
+:copyright:
+    2026 Claudio Satriano <satriano@ipgp.fr>
+
+:license:
+    GNU General Public License v3.0 or later.
+    (https://www.gnu.org/licenses/gpl-3.0.html)
+"""
+import argparse
+import inspect
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+
+# Data lengths: powers of two, primes and 5-smooth numbers
+LENGTHS = {
+    'pow2': (256, 1024, 4096),
+    'prime': (251, 1021, 4093),
+    'smooth5': (250, 1000, 3840),
+}
+QUICK_LENGTHS = {
+    'pow2': (256, 1024),
+    'prime': (251, 1021),
+    'smooth5': (250, 1000),
+}
+# Frequency ranges, as fractions of the Nyquist frequency index
+RANGES = {
+    'full': (0, 1),
+    'band': (0.25, 0.5),
+}
+WINDOWS = ('gauss', 'kazemi')
+THREADS = (1, 2, 4)
+# Number of channels of the multi-channel benchmarks
+NCHANNELS = 8
+# Number of sine tapers
+NTAPERS = (1, 4, 16)
+
+
+def _measure(func, repeat):
+    """Return the runtimes and the peak memory of ``func()``."""
+    func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def _supports(func, param):
+    """Return whether ``func`` accepts the argument ``param``."""
+    try:
+        return param in inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _lo_hi(npts, freq_range):
+    """Return the lo and hi frequency indices of a frequency range."""
+    first, last = RANGES[freq_range]
+    return int(first * (npts // 2)), int(last * (npts // 2))
+
+
+def _cases(lengths):
+    """
+    Yield the benchmark cases, as ``(name, params, func)`` tuples.
+
+    ``func`` is None if the case needs an API which is missing from the
+    installed version of stockwell.
+    """
+    # pylint: disable=import-outside-toplevel
+    from stockwell import st, sine
+    rng = np.random.default_rng(0)
+    for kind, npts_list in lengths.items():
+        for npts in npts_list:
+            data = rng.standard_normal(npts)
+            common = {'npts': npts, 'length_kind': kind}
+            for freq_range in RANGES:
+                lo, hi = _lo_hi(npts, freq_range)
+                for win_type in WINDOWS:
+                    yield 'st', dict(
+                        common, range=freq_range, win_type=win_type), (
+                        lambda d=data, lo=lo, hi=hi, w=win_type:
+                            st.st(d, lo, hi, win_type=w))
+                stran = st.st(data, lo, hi)
+                yield 'ist', dict(common, range=freq_range), (
+                    lambda s=stran, lo=lo, hi=hi: st.ist(s, lo, hi))
+            yield 'hilbert', dict(common), (
+                lambda d=data: st.hilbert(d))
+            for ntapers in NTAPERS:
+                yield 'sine_taper', dict(common, ntapers=ntapers), (
+                    lambda n=npts, k=ntapers:
+                        [sine.sine_taper(i, n) for i in range(k)])
+                yield 'sine_tapers', dict(common, ntapers=ntapers), (
+                    (lambda n=npts, k=ntapers:
+                        sine.sine_tapers(k, n, cache=False))
+                    if hasattr(sine, 'sine_tapers') else None)
+    # Multi-channel transforms, on the largest power of two length
+    npts = lengths['pow2'][-1]
+    data = rng.standard_normal((NCHANNELS, npts))
+    multichannel = _supports(st.st, 'nthreads')
+    stran = st.st(data) if multichannel else None
+    for nthreads in THREADS:
+        params = {
+            'npts': npts, 'length_kind': 'pow2', 'nchannels': NCHANNELS,
+            'nthreads': nthreads
+        }
+        yield 'st', dict(params), (
+            (lambda t=nthreads: st.st(data, nthreads=t))
+            if multichannel else None)
+        yield 'ist', dict(params), (
+            (lambda t=nthreads: st.ist(stran, nthreads=t))
+            if multichannel and _supports(st.ist, 'nthreads') else None)
+        yield 'hilbert', dict(params), (
+            (lambda t=nthreads: st.hilbert(data, nthreads=t))
+            if _supports(st.hilbert, 'nthreads') else None)
+
+
+def _git_commit(path):
+    """Return the git commit of the directory ``path``, or None."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            check=True, cwd=path
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata():
+    """Return the description of the environment of the benchmarks."""
+    # pylint: disable=import-outside-toplevel
+    import stockwell
+    return {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(
+            os.path.dirname(os.path.abspath(stockwell.__file__))),
+        'stockwell': stockwell.__version__,
+        'numpy': np.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def _key(result):
+    """Return a hashable key identifying a benchmark case."""
+    return result['name'], tuple(sorted(result['params'].items()))
+
+
+def _write(output, results):
+    """Write the results to the JSON file ``output``."""
+    with open(output, 'w', encoding='utf-8') as fp:
+        json.dump(results, fp, indent=2)
+
+
+def run(quick=False, repeat=5, name_filter=None, output=None):
+    """
+    Run the benchmarks.
+
+    Parameters
+    ----------
+    quick : bool, optional
+        Use a smaller matrix of data lengths (default False).
+    repeat : int, optional
+        Number of timed calls of each benchmark (default 5).
+    name_filter : str, optional
+        Only run the benchmarks whose name contains this string.
+    output : str, optional
+        JSON file where the results are written, after each benchmark.
+
+    Returns
+    -------
+    results : dict
+        A dictionary with keys ``'metadata'``, ``'results'`` and
+        ``'skipped'``. Each result is a dictionary with keys ``'name'``,
+        ``'params'``, ``'repeat'``, ``'time_min'``, ``'time_median'`` (in
+        seconds) and ``'peak_memory'`` (in bytes). Each skipped benchmark,
+        whose API is missing from the installed version of stockwell, is a
+        dictionary with keys ``'name'`` and ``'params'``.
+    """
+    lengths = QUICK_LENGTHS if quick else LENGTHS
+    metadata = dict(_metadata(), quick=quick, name_filter=name_filter)
+    results = {'metadata': metadata, 'results': [], 'skipped': []}
+    for name, params, func in _cases(lengths):
+        if name_filter and name_filter not in name:
+            continue
+        if func is None:
+            results['skipped'].append({'name': name, 'params': params})
+            print(
+                f'{name:12s} {_format_params(params):60s} skipped '
+                '(API not available)', flush=True)
+            continue
+        times, peak = _measure(func, repeat)
+        result = {
+            'name': name,
+            'params': params,
+            'repeat': repeat,
+            'time_min': min(times),
+            'time_median': statistics.median(times),
+            'peak_memory': peak,
+        }
+        results['results'].append(result)
+        print(
+            f'{name:12s} {_format_params(params):60s} '
+            f'{result["time_min"] * 1e3:10.3f} ms '
+            f'{peak / 2**20:9.2f} MiB', flush=True)
+        if output:
+            _write(output, results)
+    if output:
+        _write(output, results)
+    return results
+
+
+def _format_params(params):
+    """Format the parameters of a benchmark case."""
+    return ' '.join(f'{key}={val}' for key, val in params.items())
+
+
+def _in_run(result, metadata):
+    """Return whether a benchmark case is in the matrix of a run."""
+    name_filter = metadata.get('name_filter')
+    if name_filter and name_filter not in result['name']:
+        return False
+    lengths = QUICK_LENGTHS if metadata.get('quick') else LENGTHS
+    params = result['params']
+    return params['npts'] in lengths.get(params['length_kind'], ())
+
+
+def compare(results, baseline, threshold=0.1):
+    """
+    Compare the results with a baseline and print the runtime ratios.
+
+    The benchmarks of the baseline which are skipped or missing in
+    ``results`` are reported as failures, unless they are outside the
+    matrix of the run (see the ``quick`` and ``name_filter`` options of
+    :func:`run`).
+
+    Parameters
+    ----------
+    results : dict
+        Benchmark results (see :func:`run`).
+    baseline : dict
+        Baseline benchmark results.
+    threshold : float, optional
+        Relative slowdown above which a benchmark is reported as a
+        regression (default 0.1).
+
+    Returns
+    -------
+    failures : list of dict
+        The results slower than the baseline by more than ``threshold``,
+        and the baseline results which are skipped or missing in
+        ``results``.
+    """
+    base = {_key(res): res for res in baseline['results']}
+    done = {_key(res) for res in results['results']}
+    failures = []
+    for res in baseline['results']:
+        if _key(res) in done or not _in_run(res, results['metadata']):
+            continue
+        failures.append(res)
+        print(f'{res["name"]:12s} {_format_params(res["params"]):60s} MISSING')
+    for res in results['results']:
+        ref = base.get(_key(res))
+        if ref is None:
+            continue
+        ratio = res['time_min'] / ref['time_min']
+        flag = ''
+        if ratio > 1 + threshold:
+            failures.append(res)
+            flag = ' REGRESSION'
+        print(
+            f'{res["name"]:12s} {_format_params(res["params"]):60s} '
+            f'{ratio:6.2f}x{flag}')
+    return failures
+
+
+def main():
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Stockwell transforms.')
+    parser.add_argument(
+        '-o', '--output', help='write the results to this JSON file')
+    parser.add_argument(
+        '--quick', action='store_true', help='use a smaller matrix')
+    parser.add_argument(
+        '--repeat', type=int, default=5,
+        help='number of timed calls of each benchmark (default 5)')
+    parser.add_argument(
+        '--filter', dest='name_filter',
+        help='only run the benchmarks whose name contains this string')
+    parser.add_argument(
+        '--compare', metavar='BASELINE',
+        help='compare the results with this JSON file')
+    parser.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='relative slowdown reported as a regression (default 0.1)')
+    args = parser.parse_args()
+    results = run(args.quick, args.repeat, args.name_filter, args.output)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fp:
+            baseline = json.load(fp)
+        print(f'\nRuntime ratios with respect to {args.compare}:')
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
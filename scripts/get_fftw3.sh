@@ -35,4 +35,11 @@ mkdir -p fftw3
 cd fftw-$FFWT_VERSION
 ./configure --prefix="$ext_dir/fftw3" --enable-threads --enable-shared
 make -s
-make -s install
\ No newline at end of file
+make -s install
+
+# Build the single precision version (libfftw3f), needed for complex64
+make -s distclean
+./configure --prefix="$ext_dir/fftw3" --enable-threads --enable-shared \
+    --enable-float
+make -s
+make -s install
@@ -50,9 +50,13 @@ ext_modules = [
     Extension(
         'st',
         sources=['stockwell/c_libs/st.c'],
+        depends=[
+            'stockwell/c_libs/st_template.c',
+            'stockwell/c_libs/st_types.h'
+        ],
         include_dirs=include_dirs_st,
         library_dirs=library_dirs_st,
-        libraries=['fftw3'],
+        libraries=['fftw3', 'fftw3f'],
     ),
     Extension(
         'sine',
@@ -22,4 +22,7 @@ def __getattr__(name):
     if name == 'sine':
         import importlib
         return importlib.import_module('.sine', __name__)
+    if name == 'stream':
+        import importlib
+        return importlib.import_module('.stream', __name__)
     raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -39,4 +39,22 @@ void sine_taper(int k, int N, double *d)
     for (i = 0; i < N; i++) {
         d[i] = s * sin(M_PI * (k + 1) * (i + 1) / (N + 1));
     }
-}
\ No newline at end of file
+}
+
+/* Compute the first K sine tapers. d is an array of K rows of length N,
+stored one after the other. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void sine_tapers(int K, int N, double *d)
+{
+    int k;
+
+    for (k = 0; k < K; k++) {
+        sine_taper(k, N, d + (size_t)k * N);
+    }
+}
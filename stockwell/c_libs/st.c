@@ -18,6 +18,7 @@
 #include <stdlib.h>
 #include <string.h>
 #include <math.h>
+#include <time.h>
 #include <fftw3.h>
 #include "st_types.h"
 
@@ -26,402 +27,980 @@ void PyInit_st() {}
 
 char *Wisfile = NULL;
 #if defined(WIN32) || defined(_WIN32) || defined(__WIN32__) || defined(__NT__)
-	const char *Wistemplate = "%s\.fftwis";
+	const char *Wistemplate = "%s\\.fftwis";
 #else
 	const char *Wistemplate = "%s/.fftwis";
 #endif
 #define WISLEN 8
-/* Static FFTW plans — kept between calls for performance, but
-   must be destroyed before process exit to avoid segfault. */
 
-/* st() plans */
-static int st_planlen = 0;
-static double *st_g = NULL;
-static fftw_plan st_p1 = NULL, st_p2 = NULL;
-static fftw_complex *st_h = NULL, *st_H = NULL, *st_G = NULL;
+/* The FFTW planner is not thread-safe: only fftw_execute() may be called
+   concurrently. All plan creation and destruction, as well as the list of
+   live workspaces, is protected by a single lock. */
+#if defined(WIN32) || defined(_WIN32) || defined(__WIN32__) || defined(__NT__)
+	#include <windows.h>
+	static SRWLOCK st_lock = SRWLOCK_INIT;
+	#define ST_LOCK() AcquireSRWLockExclusive(&st_lock)
+	#define ST_UNLOCK() ReleaseSRWLockExclusive(&st_lock)
+#else
+	#include <pthread.h>
+	static pthread_mutex_t st_lock = PTHREAD_MUTEX_INITIALIZER;
+	#define ST_LOCK() pthread_mutex_lock(&st_lock)
+	#define ST_UNLOCK() pthread_mutex_unlock(&st_lock)
+#endif
 
-/* ist() plans */
-static int ist_planlen = 0;
-static fftw_plan ist_p2 = NULL;
-static fftw_complex *ist_h = NULL, *ist_H = NULL;
+/* FFTW wisdom. When a plan is created with a planner effort higher than
+   FFTW_ESTIMATE, the wisdom is loaded from Wisfile (once) and saved back to
+   it afterwards, so that the cost of measuring is only paid once.
+   Wisfile defaults to ~/.fftwis. Wisdom persistence can be disabled.
+   Single precision wisdom is kept in a separate file, whose name is
+   Wisfile followed by "f". */
 
-/* hilbert() plans */
-static int hilbert_planlen = 0;
-static fftw_plan hilbert_p1 = NULL, hilbert_p2 = NULL;
-static fftw_complex *hilbert_h = NULL, *hilbert_H = NULL;
+/* Precision of the transforms and of the cached plans. */
+
+enum PRECISION {PREC_DOUBLE, PREC_SINGLE};
+
+static int wisdom_enabled = 1;
+static int wisdom_loaded[2] = {0, 0};
+
+/* Planner effort, from fastest planning to fastest transforms. */
+
+enum PLANNER {ESTIMATE, MEASURE, PATIENT};
+static const unsigned planner_flags[] = {
+	FFTW_ESTIMATE, FFTW_MEASURE, FFTW_PATIENT
+};
 
-#ifdef _MSC_VER
-__declspec(dllexport)
-#endif
-void st_cleanup(void)
-{
-	if (st_planlen > 0) {
-		fftw_destroy_plan(st_p1);
-		fftw_destroy_plan(st_p2);
-		fftw_free(st_h);
-		fftw_free(st_H);
-		fftw_free(st_G);
-		free(st_g);
-		st_planlen = 0;
-	}
-	if (ist_planlen > 0) {
-		fftw_destroy_plan(ist_p2);
-		fftw_free(ist_h);
-		fftw_free(ist_H);
-		ist_planlen = 0;
-	}
-	if (hilbert_planlen > 0) {
-		fftw_destroy_plan(hilbert_p1);
-		fftw_destroy_plan(hilbert_p2);
-		fftw_free(hilbert_h);
-		fftw_free(hilbert_H);
-		hilbert_planlen = 0;
-	}
-	fftw_cleanup();
-}
 void set_wisfile(void)
 {
 	const char *home;
+	char *buf = NULL;
 
 	if (Wisfile) return;
 	#if defined(WIN32) || defined(_WIN32) || defined(__WIN32__) || defined(__NT__)
         const char *homeDrive = getenv("HOMEDRIVE");
         const char *homePath = getenv("HOMEPATH");
-        home = malloc(strlen(homeDrive)+strlen(homePath)+1);
-        strcat(home, homeDrive);
-        strcat(home, homePath);
+        if (homeDrive == NULL || homePath == NULL) return;
+        buf = (char *)malloc(strlen(homeDrive) + strlen(homePath) + 1);
+        strcpy(buf, homeDrive);
+        strcat(buf, homePath);
+        home = buf;
 	#else
         home = getenv("HOME");
+        if (home == NULL) return;
 	#endif
 	Wisfile = (char *)malloc(strlen(home) + WISLEN + 1);
 	sprintf(Wisfile, Wistemplate, home);
+	free(buf);
 }
 
-/* Convert frequencies in Hz into rows of the ST, given sampling rate and
-length. */
+/* Set the file used to load and save FFTW wisdom. If path is NULL,
+   wisdom is not persisted. */
 
-int st_freq(double f, int len, double srate)
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void st_set_wisdom_file(const char *path)
 {
-	return (int)floor(f * len / srate + .5);
+	ST_LOCK();
+	free(Wisfile);
+	Wisfile = NULL;
+	wisdom_enabled = path != NULL;
+	wisdom_loaded[PREC_DOUBLE] = wisdom_loaded[PREC_SINGLE] = 0;
+	if (path) {
+		Wisfile = (char *)malloc(strlen(path) + 1);
+		strcpy(Wisfile, path);
+	}
+	ST_UNLOCK();
 }
 
-static double gauss(int n, int m, double gamma);
-static double kazemi(int n, int m, double gamma);
-
-/* Stockwell transform of the real array data. The len argument is the
-number of time points, and it need not be a power of two. The lo and hi
-arguments specify the range of frequencies to return, in samples. If they are
-both zero, they default to lo = 0 and hi = len / 2. The result is
-returned in the complex array result, which must be preallocated, with
-n rows and len columns, where n is hi - lo + 1. For the default values of
-lo and hi, n is len / 2 + 1. */
+/* Return the file used to load and save FFTW wisdom, or NULL if wisdom
+   is not persisted. */
 
-#ifdef __cplusplus
-extern "C"
-#endif
 #ifdef _MSC_VER
 __declspec(dllexport)
 #endif
-void st(int len, int lo, int hi, double gamma, enum WINDOW window_code, double *data, double *result)
-{
-	int i, k, n, l2;
-	double s, *p;
-	static double (*window_function)(int, int, double);
-	window_function = &gauss;
-	if (window_code == KAZEMI)
-	{
-		window_function = &kazemi;
-	}
+const char *st_get_wisdom_file(void)
+{
+	const char *path;
 
-	/* Check for frequency defaults. */
+	ST_LOCK();
+	if (wisdom_enabled) set_wisfile();
+	path = wisdom_enabled ? Wisfile : NULL;
+	ST_UNLOCK();
+	return path;
+}
 
-	if (lo == 0 && hi == 0) {
-		hi = len / 2;
-	}
+/* Load (load != 0) or save the wisdom file for the given precision.
+   Must be called with st_lock held. */
 
-	/* Keep the arrays and plans around from last time, since this
-	is a very common case. Reallocate them if they change. */
-
-	if (len != st_planlen && st_planlen > 0) {
-		fftw_destroy_plan(st_p1);
-		fftw_destroy_plan(st_p2);
-		fftw_free(st_h);
-		fftw_free(st_H);
-		fftw_free(st_G);
-		free(st_g);
-		st_planlen = 0;
+static void st_wisdom_io(enum PRECISION prec, int load)
+{
+	char *filename;
+
+	set_wisfile();
+	if (Wisfile == NULL) return;
+	if (prec == PREC_DOUBLE) {
+		if (load) fftw_import_wisdom_from_filename(Wisfile);
+		else fftw_export_wisdom_to_filename(Wisfile);
+		return;
 	}
+	filename = (char *)malloc(strlen(Wisfile) + 2);
+	sprintf(filename, "%sf", Wisfile);
+	if (load) fftwf_import_wisdom_from_filename(filename);
+	else fftwf_export_wisdom_to_filename(filename);
+	free(filename);
+}
 
-	if (st_planlen == 0) {
-		st_planlen = len;
-		st_h = fftw_malloc(sizeof(fftw_complex) * len);
-		st_H = fftw_malloc(sizeof(fftw_complex) * len);
-		st_G = fftw_malloc(sizeof(fftw_complex) * len);
-		st_g = (double *)malloc(sizeof(double) * len);
-		/* Zero-initialize for safety. */
-		memset(st_h, 0, sizeof(fftw_complex) * len);
-		memset(st_H, 0, sizeof(fftw_complex) * len);
-		memset(st_G, 0, sizeof(fftw_complex) * len);
-		memset(st_g, 0, sizeof(double) * len);
+/* Load the wisdom file, if not done yet. A missing file is not an error.
+   Must be called with st_lock held. */
 
+static void st_load_wisdom(enum PRECISION prec)
+{
+	if (!wisdom_enabled || wisdom_loaded[prec]) return;
+	st_wisdom_io(prec, 1);
+	wisdom_loaded[prec] = 1;
+}
 
-		/* Set up the fftw plans. */
+/* Save the accumulated wisdom. Write errors (e.g., read-only home
+   directory) are silently ignored: the wisdom is simply not persisted.
+   Must be called with st_lock held. */
 
-		st_p1 = fftw_plan_dft_1d(len, st_h, st_H, FFTW_FORWARD, FFTW_ESTIMATE);
-		st_p2 = fftw_plan_dft_1d(len, st_G, st_h, FFTW_BACKWARD, FFTW_ESTIMATE);
-	}
+static void st_save_wisdom(enum PRECISION prec)
+{
+	if (!wisdom_enabled) return;
+	st_wisdom_io(prec, 0);
+}
 
-	/* Convert the input to complex. Also compute the mean. */
+/* Instrumentation. Each workspace counts the plans built and found in the
+   cache, the FFTs executed, the windows evaluated and found in the window
+   banks, and the bytes of transform rows and signals written. When timing
+   is enabled, it also accumulates the time spent building plans,
+   evaluating windows, executing FFTs and storing the output. Since the
+   counters of a workspace are updated without locking, they are only read
+   by the thread using it: at the end of each transform, they are added to
+   st_totals, protected by st_lock, and reset. */
 
-	s = 0.;
-	memset(st_h, 0, sizeof(fftw_complex) * len);
-	for (i = 0; i < len; i++) {
-		st_h[i][0] = data[i];
-		s += data[i];
-	}
-	s /= len;
+enum ST_COUNTER {
+	COUNT_PLAN_BUILDS, COUNT_PLAN_HITS, COUNT_FFTS, COUNT_WINDOW_EVALS,
+	COUNT_WINDOW_HITS, COUNT_BYTES, NCOUNTERS
+};
+enum ST_TIMER {TIME_PLAN, TIME_WINDOW, TIME_FFT, TIME_STORE, NTIMERS};
+
+typedef struct {
+	long long counts[NCOUNTERS];
+	double times[NTIMERS];
+} st_stats;
 
-	/* FFT. */
+static int st_timing = 0;
+static st_stats st_totals;
 
-	fftw_execute(st_p1); /* h -> H */
+/* Monotonic time in seconds. */
 
-	/* Hilbert transform. The upper half-circle gets multiplied by
-	two, and the lower half-circle gets set to zero.  The real axis
-	is left alone. */
+static double st_now(void)
+{
+#if defined(WIN32) || defined(_WIN32) || defined(__WIN32__) || defined(__NT__)
+	LARGE_INTEGER count, freq;
+
+	QueryPerformanceCounter(&count);
+	QueryPerformanceFrequency(&freq);
+	return (double)count.QuadPart / freq.QuadPart;
+#else
+	struct timespec ts;
 
-	l2 = (len + 1) / 2;
-	for (i = 1; i < l2; i++) {
-		st_H[i][0] *= 2.;
-		st_H[i][1] *= 2.;
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + 1e-9 * ts.tv_nsec;
+#endif
+}
+
+/* Start timing a phase: return the current time, or zero if timing is
+   disabled. */
+
+static double st_tic(void)
+{
+	return st_timing ? st_now() : 0.;
+}
+
+/* Add the time elapsed since t0 (see st_tic()) to a timer of stats. */
+
+static void st_toc(st_stats *stats, enum ST_TIMER timer, double t0)
+{
+	if (st_timing) stats->times[timer] += st_now() - t0;
+}
+
+/* FFTW plans are cached by length, direction and precision, together with
+   their input and output buffers and the planner effort used to create them.
+   Complex plans have len complex input and output values. Real-to-complex
+   forward plans have len real input values and len / 2 + 1 complex output
+   values. Each workspace keeps its own cache, as a list
+   ordered from the most to the least recently used plan. */
+
+enum PLAN_KIND {PLAN_FORWARD, PLAN_BACKWARD, PLAN_R2C};
+
+typedef struct st_plan st_plan;
+struct st_plan {
+	enum PLAN_KIND kind;
+	int len;
+	enum PRECISION prec;
+	enum PLANNER planner;
+	void *plan; /* fftw_plan or fftwf_plan */
+	void *in, *out;
+	st_plan *prev, *next;
+};
+
+/* Maximum number of plans kept in the cache of each workspace. */
+
+static int st_cache_capacity = 16;
+
+/* Window bank: the window values of the rows of st() for a given length,
+   window, gamma and tol, kept between calls since they do not depend on the
+   data. Row n holds the window_support() + 1 values of its window, and is
+   only computed when it is first used. */
+
+typedef struct st_bank st_bank;
+struct st_bank {
+	int len;
+	enum WINDOW window_code;
+	double gamma, tol;
+	double **rows; /* len / 2 + 1 rows, NULL until computed */
+	size_t bytes;
+	st_bank *prev, *next;
+};
+
+/* Maximum number of bytes used by the window banks of all the workspaces,
+   and number of bytes they use, protected by st_lock. A workspace only
+   evicts its own banks, since the banks of the other workspaces may be in
+   use: when the capacity is reached, the windows which do not fit are
+   computed at each call. */
+
+static size_t st_bank_capacity = (size_t)64 << 20;
+static size_t st_bank_total = 0;
+
+/* A workspace holds the FFTW plans and work buffers used by st(), ist()
+   and hilbert(). They are kept between calls for performance. Each thread
+   must use its own workspace: two transforms can run concurrently as long
+   as they are given different workspaces. */
+
+struct st_workspace {
+	/* Plan cache, most recently used first. */
+	st_plan *plans;
+	int nplans;
+
+	/* Window buffer for st(). */
+	double *g;
+	int glen;
+
+	/* Twiddle factor table for ist(). */
+	double *tw;
+	int twlen;
+
+	/* Window banks for st(), most recently used first. */
+	st_bank *banks;
+	size_t bank_bytes;
+
+	/* Instrumentation counters and timers. */
+	st_stats stats;
+
+	/* List of live workspaces, used by st_cleanup(). */
+	st_workspace *prev, *next;
+};
+
+static st_workspace *workspaces = NULL;
+
+/* Remove a plan from the cache of a workspace and destroy it.
+   Must be called with st_lock held. */
+
+static void st_plan_free(st_workspace *ws, st_plan *plan)
+{
+	if (plan->prev) plan->prev->next = plan->next;
+	else ws->plans = plan->next;
+	if (plan->next) plan->next->prev = plan->prev;
+	ws->nplans--;
+	if (plan->prec == PREC_SINGLE) {
+		fftwf_destroy_plan(plan->plan);
+		fftwf_free(plan->in);
+		fftwf_free(plan->out);
+	} else {
+		fftw_destroy_plan(plan->plan);
+		fftw_free(plan->in);
+		fftw_free(plan->out);
 	}
-	l2 = len / 2 + 1;
-	for (i = l2; i < len; i++) {
-		st_H[i][0] = 0.;
-		st_H[i][1] = 0.;
+	free(plan);
+}
+
+/* Remove a window bank from a workspace and free it.
+   Must be called with st_lock held. */
+
+static void st_bank_free(st_workspace *ws, st_bank *bank)
+{
+	int n;
+
+	if (bank->prev) bank->prev->next = bank->next;
+	else ws->banks = bank->next;
+	if (bank->next) bank->next->prev = bank->prev;
+	ws->bank_bytes -= bank->bytes;
+	st_bank_total -= bank->bytes;
+	for (n = 0; n <= bank->len / 2; n++) {
+		free(bank->rows[n]);
 	}
+	free(bank->rows);
+	free(bank);
+}
 
-	/* Fill in rows of the result. */
+/* Evict the least recently used window banks of a workspace, except keep,
+   until size more bytes fit in the capacity. If they fit, add them to the
+   bytes used by the window banks, and return 1, else return 0.
+   Must be called with st_lock held. */
+
+static int st_bank_reserve(st_workspace *ws, st_bank *keep, size_t size)
+{
+	st_bank *bank;
+
+	if (st_bank_total + size > st_bank_capacity) {
+		for (bank = ws->banks; bank && bank->next; bank = bank->next);
+		while (bank && bank != keep &&
+			st_bank_total + size > st_bank_capacity) {
+			st_bank *prev = bank->prev;
+			st_bank_free(ws, bank);
+			bank = prev;
+		}
+		if (st_bank_total + size > st_bank_capacity) return 0;
+	}
+	ws->bank_bytes += size;
+	st_bank_total += size;
+	return 1;
+}
 
-	p = result;
+/* Return the window bank for the given length, window, gamma and tol,
+   creating it if it is not in the workspace, or NULL if it does not fit in
+   the capacity. The bank is moved to the front of the list. */
 
-	/* The row for lo == 0 contains the mean. */
+static st_bank *st_get_bank(st_workspace *ws, int len,
+	enum WINDOW window_code, double gamma, double tol)
+{
+	size_t size;
+	st_bank *bank;
 
-	n = lo;
-	if (n == 0) {
-		for (i = 0; i < len; i++) {
-			*p++ = s;
-			*p++ = 0.;
+	for (bank = ws->banks; bank; bank = bank->next) {
+		if (bank->len == len && bank->window_code == window_code &&
+			bank->gamma == gamma && bank->tol == tol) break;
+	}
+	if (bank) {
+		if (bank == ws->banks) return bank;
+		bank->prev->next = bank->next;
+		if (bank->next) bank->next->prev = bank->prev;
+	} else {
+		size = sizeof(st_bank) + sizeof(double *) * (len / 2 + 1);
+		ST_LOCK();
+		if (!st_bank_reserve(ws, NULL, size)) {
+			ST_UNLOCK();
+			return NULL;
 		}
-		n++;
+		ST_UNLOCK();
+		bank = (st_bank *)malloc(sizeof(st_bank));
+		bank->len = len;
+		bank->window_code = window_code;
+		bank->gamma = gamma;
+		bank->tol = tol;
+		bank->rows = (double **)calloc(len / 2 + 1, sizeof(double *));
+		bank->bytes = size;
 	}
+	bank->prev = NULL;
+	bank->next = ws->banks;
+	if (ws->banks) ws->banks->prev = bank;
+	ws->banks = bank;
+	return bank;
+}
 
-	/* Subsequent rows contain the inverse FFT of the spectrum
-	multiplied with the FFT of scaled gaussians. */
+/* Add the counters and the timers of a workspace to st_totals, and reset
+   them. Must be called with st_lock held. */
 
-	while (n <= hi) {
+static void st_stats_merge(st_workspace *ws)
+{
+	int i;
 
-		/* Scale the FFT of the gaussian. Negative frequencies
-		wrap around. */
+	for (i = 0; i < NCOUNTERS; i++) {
+		st_totals.counts[i] += ws->stats.counts[i];
+	}
+	for (i = 0; i < NTIMERS; i++) {
+		st_totals.times[i] += ws->stats.times[i];
+	}
+	memset(&ws->stats, 0, sizeof(st_stats));
+}
 
-		st_g[0] = (*window_function)(n, 0, gamma);
-		l2 = len / 2 + 1;
-		for (i = 1; i < l2; i++) {
-			st_g[i] = st_g[len - i] = (*window_function)(n, i, gamma);
-		}
+/* Evict the least recently used plans and window banks until the caches
+   fit their capacities, and merge the counters of the workspace (see
+   st_stats_merge()). This is done at the end of each transform, so that
+   the plans used during a transform are never evicted while in use. */
 
-		k = len - n;
-		for (i = 0; i < len; i++) {
-			if (k >= len) k -= len;
-			s = st_g[k++];
-			st_G[i][0] = st_H[i][0] * s;
-			st_G[i][1] = st_H[i][1] * s;
-		}
+static void st_cache_trim(st_workspace *ws)
+{
+	st_plan *plan;
+
+	ST_LOCK();
+	st_stats_merge(ws);
+	st_bank_reserve(ws, NULL, 0);
+	plan = ws->plans;
+	while (plan && plan->next) plan = plan->next;
+	while (ws->nplans > st_cache_capacity) {
+		st_plan *prev = plan->prev;
+		st_plan_free(ws, plan);
+		plan = prev;
+	}
+	ST_UNLOCK();
+}
 
-		/* Inverse FFT the result to get the next row. */
+/* Create the FFTW plan and the buffers of a cache entry.
+   Must be called with st_lock held. */
 
-		fftw_execute(st_p2); /* G -> h */
-		for (i = 0; i < len; i++) {
-			*p++ = st_h[i][0] / len;
-			*p++ = st_h[i][1] / len;
+static void st_plan_create(st_plan *plan)
+{
+	int len = plan->len;
+	unsigned flags = planner_flags[plan->planner];
+	int sign = plan->kind == PLAN_FORWARD ? FFTW_FORWARD : FFTW_BACKWARD;
+	size_t real_size, complex_size, insize, outsize;
+
+	if (plan->prec == PREC_SINGLE) {
+		real_size = sizeof(float);
+		complex_size = sizeof(fftwf_complex);
+	} else {
+		real_size = sizeof(double);
+		complex_size = sizeof(fftw_complex);
+	}
+	if (plan->kind == PLAN_R2C) {
+		insize = real_size * len;
+		outsize = complex_size * (len / 2 + 1);
+	} else {
+		insize = outsize = complex_size * len;
+	}
+	if (plan->prec == PREC_SINGLE) {
+		plan->in = fftwf_malloc(insize);
+		plan->out = fftwf_malloc(outsize);
+		if (plan->kind == PLAN_R2C) {
+			plan->plan = fftwf_plan_dft_r2c_1d(len, plan->in, plan->out,
+				flags);
+		} else {
+			plan->plan = fftwf_plan_dft_1d(len, plan->in, plan->out,
+				sign, flags);
 		}
+	} else {
+		plan->in = fftw_malloc(insize);
+		plan->out = fftw_malloc(outsize);
+		if (plan->kind == PLAN_R2C) {
+			plan->plan = fftw_plan_dft_r2c_1d(len, plan->in, plan->out,
+				flags);
+		} else {
+			plan->plan = fftw_plan_dft_1d(len, plan->in, plan->out,
+				sign, flags);
+		}
+	}
+	/* Zero-initialize for safety, after planning, since
+	measuring overwrites the buffers. */
+	memset(plan->in, 0, insize);
+	memset(plan->out, 0, outsize);
+}
+
+/* Return the plan of the given kind, length and precision, creating it if
+   it is not in the cache. A cached plan created with a higher planner effort
+   than requested is also accepted. The plan is moved to the front of the
+   cache. */
 
-		/* Go to the next row. */
+static st_plan *st_get_plan(st_workspace *ws, enum PLAN_KIND kind, int len,
+	enum PRECISION prec, enum PLANNER planner)
+{
+	double t0;
+	st_plan *plan;
 
-		n++;
+	for (plan = ws->plans; plan; plan = plan->next) {
+		if (plan->kind == kind && plan->len == len && plan->prec == prec &&
+			plan->planner >= planner) break;
 	}
+	if (plan) {
+		ws->stats.counts[COUNT_PLAN_HITS]++;
+		if (plan == ws->plans) return plan;
+		plan->prev->next = plan->next;
+		if (plan->next) plan->next->prev = plan->prev;
+	} else {
+		ST_LOCK();
+		/* Time the planning only, not the wait for the lock. */
+		t0 = st_tic();
+		/* Replace any plan created with a lower planner effort. */
+		for (plan = ws->plans; plan; plan = plan->next) {
+			if (plan->kind == kind && plan->len == len &&
+				plan->prec == prec) {
+				st_plan_free(ws, plan);
+				break;
+			}
+		}
+		if (planner != ESTIMATE) st_load_wisdom(prec);
+		plan = (st_plan *)malloc(sizeof(st_plan));
+		plan->kind = kind;
+		plan->len = len;
+		plan->prec = prec;
+		plan->planner = planner;
+		st_plan_create(plan);
+		if (planner != ESTIMATE) st_save_wisdom(prec);
+		ST_UNLOCK();
+		ws->nplans++;
+		ws->stats.counts[COUNT_PLAN_BUILDS]++;
+		st_toc(&ws->stats, TIME_PLAN, t0);
+	}
+	plan->prev = NULL;
+	plan->next = ws->plans;
+	if (ws->plans) ws->plans->prev = plan;
+	ws->plans = plan;
+	return plan;
 }
 
-/* This is the Fourier Transform of a Gaussian. */
+/* Free all the plans and buffers of a workspace.
+   Must be called with st_lock held. */
 
-static double gauss(int n, int m, double gamma)
+static void st_workspace_clear(st_workspace *ws)
 {
-	return exp(-2. * M_PI * M_PI * m * m * gamma * gamma / (n * n));
+	while (ws->plans) st_plan_free(ws, ws->plans);
+	free(ws->g);
+	ws->g = NULL;
+	ws->glen = 0;
+	free(ws->tw);
+	ws->tw = NULL;
+	ws->twlen = 0;
+	while (ws->banks) st_bank_free(ws, ws->banks);
 }
 
-/* This is the Fourier Transform of a Kazemi window. */
-static double kazemi(int n, int m, double gamma)
+/* Create a new, empty workspace. Plans are only created on first use. */
+
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+st_workspace *st_workspace_new(void)
 {
-	return 1/(1+((m * m * gamma  / n) * (m * m * gamma  / n)));
+	st_workspace *ws;
+
+	ws = (st_workspace *)calloc(1, sizeof(st_workspace));
+	if (ws == NULL) return NULL;
+	ST_LOCK();
+	ws->next = workspaces;
+	if (workspaces) workspaces->prev = ws;
+	workspaces = ws;
+	ST_UNLOCK();
+	return ws;
 }
 
+/* Destroy a workspace. It must not be in use by any thread. */
 
-/* Inverse Stockwell transform. */
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void st_workspace_free(st_workspace *ws)
+{
+	if (ws == NULL) return;
+	ST_LOCK();
+	st_workspace_clear(ws);
+	st_stats_merge(ws);
+	if (ws->prev) ws->prev->next = ws->next;
+	else workspaces = ws->next;
+	if (ws->next) ws->next->prev = ws->prev;
+	ST_UNLOCK();
+	free(ws);
+}
 
-#ifdef __cplusplus
-extern "C"
+/* Set the maximum number of plans cached by each workspace. A capacity
+   of zero disables caching. Caches larger than the new capacity are
+   trimmed the next time they are used. */
+
+#ifdef _MSC_VER
+__declspec(dllexport)
 #endif
+void st_cache_set_capacity(int capacity)
+{
+	st_cache_capacity = capacity < 0 ? 0 : capacity;
+}
+
 #ifdef _MSC_VER
 __declspec(dllexport)
 #endif
-void ist(int len, int lo, int hi, double *data, double *result)
+int st_cache_get_capacity(void)
 {
-	int i, n, l2;
-	double *p;
-	double fr, fi, dr, di, ef;
+	return st_cache_capacity;
+}
 
-	/* Check for frequency defaults. */
+/* Set the maximum number of bytes used by the window banks of all the
+   workspaces. A capacity of zero disables the window banks. When the
+   capacity is lowered, the banks of each workspace are evicted the next
+   time it is used. */
 
-	if (lo == 0 && hi == 0) {
-		hi = len / 2;
-	}
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void st_window_cache_set_capacity(size_t capacity)
+{
+	ST_LOCK();
+	st_bank_capacity = capacity;
+	ST_UNLOCK();
+}
+
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+size_t st_window_cache_get_capacity(void)
+{
+	return st_bank_capacity;
+}
 
-	/* Keep the arrays and plans around from last time, since this
-	is a very common case. Reallocate them if they change. */
+/* Return the number of bytes used by the window banks of a workspace. */
 
-	if (len != ist_planlen && ist_planlen > 0) {
-		fftw_destroy_plan(ist_p2);
-		fftw_free(ist_h);
-		fftw_free(ist_H);
-		ist_planlen = 0;
-	}
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+size_t st_window_cache_bytes(st_workspace *ws)
+{
+	return ws->bank_bytes;
+}
 
-	if (ist_planlen == 0) {
-		ist_planlen = len;
-		ist_h = fftw_malloc(sizeof(fftw_complex) * len);
-		ist_H = fftw_malloc(sizeof(fftw_complex) * len);
-		memset(ist_h, 0, sizeof(fftw_complex) * len);
-		memset(ist_H, 0, sizeof(fftw_complex) * len);
+/* Return the number of bytes used by the window banks of all the
+   workspaces. */
 
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+size_t st_window_cache_total(void)
+{
+	size_t total;
 
-		/* Set up the fftw plans. */
+	ST_LOCK();
+	total = st_bank_total;
+	ST_UNLOCK();
+	return total;
+}
 
-		ist_p2 = fftw_plan_dft_1d(len, ist_H, ist_h, FFTW_BACKWARD, FFTW_ESTIMATE);
-	}
+/* Enable (enabled != 0) or disable the timing of the phases of the
+   transforms. The counters are always updated. */
 
-	/* Sum the complex array across time, multiplying by
-	   complex exponential factor to perform the frequency
-	   shift required for the inverse. */
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void st_stats_set_timing(int enabled)
+{
+	st_timing = enabled != 0;
+}
 
-	memset(ist_H, 0, sizeof(fftw_complex) * len);
-	p = data;
-	for (n = lo; n <= hi; n++) {
-		for (i = 0; i < len; i++) {
-			double dr, di, ef, fr, fi;
-			dr = *p++;
-			di = *p++;
-			ef = -2 * M_PI * n * i / len;
-			fr = cos(ef);
-			fi = sin(ef);
-			ist_H[n][0] += dr * fr - di * fi;
-			ist_H[n][1] += dr * fi + di * fr;
-		}
-	}
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+int st_stats_get_timing(void)
+{
+	return st_timing;
+}
 
-	/* Invert the Hilbert transform. */
+/* Copy the counters and the timers of all the workspaces, including the
+   freed ones, into counts (NCOUNTERS values) and times (NTIMERS values).
+   The transforms which are still running are not included. */
 
-	l2 = (len + 1) / 2;
-	for (i = 1; i < l2; i++) {
-		ist_H[i][0] /= 2.;
-		ist_H[i][1] /= 2.;
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void st_stats_get(long long *counts, double *times)
+{
+	int i;
+
+	ST_LOCK();
+	for (i = 0; i < NCOUNTERS; i++) {
+		counts[i] = st_totals.counts[i];
 	}
-	l2 = len / 2 + 1;
-	for (i = l2; i < len; i++) {
-		ist_H[i][0] = ist_H[len - i][0];
-		ist_H[i][1] = -ist_H[len - i][1];
+	for (i = 0; i < NTIMERS; i++) {
+		times[i] = st_totals.times[i];
 	}
+	ST_UNLOCK();
+}
 
-	/* Inverse FFT. */
+/* Reset the counters and the timers of all the workspaces. The counters of
+   the transforms which are still running are added when they end. */
 
-	fftw_execute(ist_p2); /* H -> h */
-	p = result;
-	for (i = 0; i < len; i++) {
-		*p++ = ist_h[i][0] / len;
-	}
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void st_stats_reset(void)
+{
+	ST_LOCK();
+	memset(&st_totals, 0, sizeof(st_stats));
+	ST_UNLOCK();
 }
 
-/* This does just the Hilbert transform. */
+/* Describe the plans cached by a workspace, from the most to the least
+   recently used. At most maxn entries are written to kinds, lens and precs.
+   Return the total number of cached plans. */
 
-#ifdef __cplusplus
-extern "C"
+#ifdef _MSC_VER
+__declspec(dllexport)
 #endif
+int st_cache_info(st_workspace *ws, int maxn, int *kinds, int *lens, int *precs)
+{
+	int i;
+	st_plan *plan;
+
+	for (i = 0, plan = ws->plans; plan && i < maxn; i++, plan = plan->next) {
+		kinds[i] = plan->kind;
+		lens[i] = plan->len;
+		precs[i] = plan->prec;
+	}
+	return ws->nplans;
+}
+
+/* Free all the plans cached by a workspace. */
+
 #ifdef _MSC_VER
 __declspec(dllexport)
 #endif
-void hilbert(int len, double *data, double *result)
+void st_cache_clear(st_workspace *ws)
 {
-	int i, l2;
-	double *p;
+	ST_LOCK();
+	st_workspace_clear(ws);
+	ST_UNLOCK();
+}
 
-	/* Keep the arrays and plans around from last time, since this
-	is a very common case. Reallocate them if they change. */
+/* Free the plans of all the live workspaces, which must not be in use.
+   Workspaces stay valid and will recreate their plans when needed.
+   This must be called before process exit to avoid a segfault. */
+
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void st_cleanup(void)
+{
+	st_workspace *ws;
 
-	if (len != hilbert_planlen && hilbert_planlen > 0) {
-		fftw_destroy_plan(hilbert_p1);
-		fftw_destroy_plan(hilbert_p2);
-		fftw_free(hilbert_h);
-		fftw_free(hilbert_H);
-		hilbert_planlen = 0;
+	ST_LOCK();
+	for (ws = workspaces; ws; ws = ws->next) {
+		st_workspace_clear(ws);
 	}
+	/* This also forgets the wisdom, which will be loaded again. */
+	fftw_cleanup();
+	fftwf_cleanup();
+	wisdom_loaded[PREC_DOUBLE] = wisdom_loaded[PREC_SINGLE] = 0;
+	ST_UNLOCK();
+}
 
-	if (hilbert_planlen == 0) {
-		hilbert_planlen = len;
-		hilbert_h = fftw_malloc(sizeof(fftw_complex) * len);
-		hilbert_H = fftw_malloc(sizeof(fftw_complex) * len);
-		memset(hilbert_h, 0, sizeof(fftw_complex) * len);
-		memset(hilbert_H, 0, sizeof(fftw_complex) * len);
+/* Convert frequencies in Hz into rows of the ST, given sampling rate and
+length. */
 
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+int st_freq(double f, int len, double srate)
+{
+	return (int)floor(f * len / srate + .5);
+}
 
-		/* Set up the fftw plans. */
+static double gauss(int n, int m, double gamma);
+static double kazemi(int n, int m, double gamma);
+typedef double (*window_fn)(int, int, double);
+static window_fn get_window_function(enum WINDOW window_code);
+static int window_support(enum WINDOW window_code, int n, double gamma,
+	double tol, int len);
 
-		hilbert_p1 = fftw_plan_dft_1d(len, hilbert_h, hilbert_H, FFTW_FORWARD, FFTW_ESTIMATE);
-		hilbert_p2 = fftw_plan_dft_1d(len, hilbert_H, hilbert_h, FFTW_BACKWARD, FFTW_ESTIMATE);
+/* Make sure that the window buffer of the workspace holds len values. */
+
+static void st_window_buffer(st_workspace *ws, int len)
+{
+	if (len > ws->glen) {
+		free(ws->g);
+		ws->g = (double *)malloc(sizeof(double) * len);
+		ws->glen = len;
 	}
+}
 
-	/* Convert the input to complex. */
+/* Return the table of the len twiddle factors exp(-2 pi i k / len), as
+interleaved real and imaginary parts, stored in the workspace. It is only
+computed again when len changes. */
 
-	memset(hilbert_h, 0, sizeof(fftw_complex) * len);
-	for (i = 0; i < len; i++) {
-		hilbert_h[i][0] = data[i];
+static double *st_twiddle_table(st_workspace *ws, int len)
+{
+	int k;
+	double ef;
+
+	if (len != ws->twlen) {
+		free(ws->tw);
+		ws->tw = (double *)malloc(sizeof(double) * 2 * len);
+		for (k = 0; k < len; k++) {
+			ef = -2 * M_PI * k / len;
+			ws->tw[2 * k] = cos(ef);
+			ws->tw[2 * k + 1] = sin(ef);
+		}
+		ws->twlen = len;
 	}
+	return ws->tw;
+}
 
-	/* FFT. */
+/* Return the values of the window of row n over its support, and set w to
+the half-width of the support (see window_support()). The values are taken
+from the window bank of the workspace, where they are stored the first time
+they are computed. If the bank is full, they are computed into the window
+buffer of the workspace (see st_window_buffer()), which is also used for
+rows outside the bank, i.e., not between 1 and len / 2. */
 
-	fftw_execute(hilbert_p1); /* h -> H */
+static double *st_window(st_workspace *ws, int len, int n, double gamma,
+	enum WINDOW window_code, double tol, int *w)
+{
+	int m;
+	size_t size;
+	double t0, *g = NULL;
+	st_bank *bank;
+	window_fn window_function;
+
+	*w = window_support(window_code, n, gamma, tol, len);
+	bank = NULL;
+	if (n >= 1 && n <= len / 2) {
+		bank = st_get_bank(ws, len, window_code, gamma, tol);
+	}
+	if (bank && bank->rows[n]) {
+		ws->stats.counts[COUNT_WINDOW_HITS]++;
+		return bank->rows[n];
+	}
+	size = sizeof(double) * (*w + 1);
+	if (bank) {
+		ST_LOCK();
+		if (st_bank_reserve(ws, bank, size)) {
+			g = (double *)malloc(size);
+			if (g) {
+				bank->rows[n] = g;
+				bank->bytes += size;
+			} else {
+				ws->bank_bytes -= size;
+				st_bank_total -= size;
+			}
+		}
+		ST_UNLOCK();
+	}
+	if (g == NULL) g = ws->g;
+	t0 = st_tic();
+	window_function = get_window_function(window_code);
+	for (m = 0; m <= *w; m++) {
+		g[m] = (*window_function)(n, m, gamma);
+	}
+	ws->stats.counts[COUNT_WINDOW_EVALS]++;
+	st_toc(&ws->stats, TIME_WINDOW, t0);
+	return g;
+}
 
-	/* Hilbert transform. The upper half-circle gets multiplied by
-	two, and the lower half-circle gets set to zero.  The real axis
-	is left alone. */
+/* Stop timing the storage of the output (see st_tic()), and count the
+   bytes written. */
 
-	l2 = (len + 1) / 2;
-	for (i = 1; i < l2; i++) {
-		hilbert_H[i][0] *= 2.;
-		hilbert_H[i][1] *= 2.;
-	}
-	l2 = len / 2 + 1;
-	for (i = l2; i < len; i++) {
-		hilbert_H[i][0] = 0.;
-		hilbert_H[i][1] = 0.;
+static void st_stored(st_workspace *ws, double t0, size_t bytes)
+{
+	st_toc(&ws->stats, TIME_STORE, t0);
+	ws->stats.counts[COUNT_BYTES] += bytes;
+}
+
+/* Frequency band of row n, i.e., the non-negative frequencies where its
+window is not negligible. Rows must not exceed len / 2. */
+
+static void st_row_band(enum WINDOW window_code, int n, double gamma,
+	double tol, int len, int *a, int *b)
+{
+	int w;
+
+	w = window_support(window_code, n, gamma, tol, len);
+	*a = n - w < 0 ? 0 : n - w;
+	*b = n + w > len / 2 ? len / 2 : n + w;
+}
+
+/* Length of row n in the decimated Stockwell transform, when each row has
+its own sampling rate: the smallest power of two which is not smaller than
+the number of frequencies in the band of the row, or len, if smaller. */
+
+static int st_row_length(enum WINDOW window_code, int n, double gamma,
+	double tol, int len)
+{
+	int a, b, m;
+
+	st_row_band(window_code, n, gamma, tol, len, &a, &b);
+	for (m = 1; m < b - a + 1; m *= 2);
+	return m < len ? m : len;
+}
+
+/* Compute the lengths of the rows lo to hi of the decimated Stockwell
+transform (see st_decimated()), and store them into lens. If nout is
+positive, all the rows have length nout. Return the largest bandwidth of
+the rows, in frequency samples, which is the smallest nout that does not
+alias any row. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+int st_decimated_lengths(int len, int lo, int hi, double gamma, enum WINDOW window_code, double tol, int nout, int *lens)
+{
+	int n, a, b, bw = 0;
+
+	for (n = lo; n <= hi; n++) {
+		st_row_band(window_code, n, gamma, tol, len, &a, &b);
+		if (b - a + 1 > bw) bw = b - a + 1;
+		*lens++ = nout > 0 ? nout : st_row_length(window_code, n, gamma, tol, len);
 	}
+	return bw;
+}
 
-	/* Inverse FFT. */
+/* This is the Fourier Transform of a Gaussian. */
 
-	fftw_execute(hilbert_p2); /* H -> h */
+static double gauss(int n, int m, double gamma)
+{
+	return exp(-2. * M_PI * M_PI * m * m * gamma * gamma / (n * n));
+}
+
+/* This is the Fourier Transform of a Kazemi window. */
+static double kazemi(int n, int m, double gamma)
+{
+	return 1/(1+((m * m * gamma  / n) * (m * m * gamma  / n)));
+}
 
-	/* Fill in the rows of the result. */
+/* Return the window function for the given window code. */
 
-	p = result;
-	for (i = 0; i < len; i++) {
-		*p++ = hilbert_h[i][0] / len;
-		*p++ = hilbert_h[i][1] / len;
+static window_fn get_window_function(enum WINDOW window_code)
+{
+	return window_code == KAZEMI ? &kazemi : &gauss;
+}
+
+/* Half-width of the support of the window for frequency n, i.e., the
+largest distance m from n at which the window is larger than tol (the
+windows peak at 1 for m = 0). It is at most len / 2, which is returned
+when tol is zero. */
+
+static int window_support(enum WINDOW window_code, int n, double gamma,
+	double tol, int len)
+{
+	double w;
+
+	if (tol <= 0. || gamma <= 0.) return len / 2;
+	if (window_code == KAZEMI) {
+		w = sqrt(abs(n) / gamma * sqrt(1. / tol - 1.));
+	} else {
+		w = abs(n) / (M_PI * gamma) * sqrt(-log(tol) / 2.);
 	}
+	return w < len / 2 ? (int)w : len / 2;
 }
+
+/* Double precision transforms: st(), st_rows(), st_decimated(), ist(),
+ist_rows() and hilbert(). */
+
+#define REAL double
+#define X(name) fftw_ ## name
+#define F(name) name
+#define PREC PREC_DOUBLE
+#include "st_template.c"
+#undef REAL
+#undef X
+#undef F
+#undef PREC
+
+/* Single precision transforms: stf(), st_rowsf(), st_decimatedf(), istf(),
+ist_rowsf() and hilbertf(). */
+
+#define REAL float
+#define X(name) fftwf_ ## name
+#define F(name) name ## f
+#define PREC PREC_SINGLE
+#include "st_template.c"
+#undef REAL
+#undef X
+#undef F
+#undef PREC
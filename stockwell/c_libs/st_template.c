@@ -0,0 +1,1005 @@
+/*
+ * st_template.c
+ *
+ * Precision-dependent part of st.c. This file is not compiled on its own:
+ * it is included twice by st.c, once for double precision and once for
+ * single precision, with the following macros defined:
+ *
+ *   REAL     real type (double or float)
+ *   X(name)  FFTW name (fftw_name or fftwf_name)
+ *   F(name)  name of the functions defined here (name or namef)
+ *   PREC     precision of the cached plans (PREC_DOUBLE or PREC_SINGLE)
+ *
+ * The contents of this file is free and unencumbered software released
+ * into the public domain. For more information, please refer to
+ * https://unlicense.org
+ */
+
+/* Store m complex values of out, multiplied by scale, into p, in the
+output format (one complex value, or one real value per sample). Return
+the position in p after the last stored value. */
+
+static REAL *F(st_store)(REAL *p, X(complex) *out, int m, double scale,
+	enum OUTPUT output)
+{
+	int i;
+	double re, im;
+
+	switch (output) {
+	case OUT_AMPLITUDE:
+		for (i = 0; i < m; i++) {
+			re = out[i][0] * scale;
+			im = out[i][1] * scale;
+			*p++ = sqrt(re * re + im * im);
+		}
+		break;
+	case OUT_POWER:
+		for (i = 0; i < m; i++) {
+			re = out[i][0] * scale;
+			im = out[i][1] * scale;
+			*p++ = re * re + im * im;
+		}
+		break;
+	case OUT_DB:
+		for (i = 0; i < m; i++) {
+			re = out[i][0] * scale;
+			im = out[i][1] * scale;
+			*p++ = 10. * log10(re * re + im * im);
+		}
+		break;
+	case OUT_PHASE:
+		for (i = 0; i < m; i++) {
+			*p++ = atan2(out[i][1], out[i][0]);
+		}
+		break;
+	default:
+		for (i = 0; i < m; i++) {
+			*p++ = out[i][0] * scale;
+			*p++ = out[i][1] * scale;
+		}
+	}
+	return p;
+}
+
+/* Store the row for n == 0, which contains the mean, like st_store(). */
+
+static REAL *F(st_store_mean)(REAL *p, int m, double mean,
+	enum OUTPUT output)
+{
+	int i;
+	X(complex) c;
+
+	c[0] = mean;
+	c[1] = 0.;
+	for (i = 0; i < m; i++) {
+		p = F(st_store)(p, &c, 1, 1., output);
+	}
+	return p;
+}
+
+/* Execute the FFT of a plan, counting and timing it in the workspace. */
+
+static void F(st_execute)(st_workspace *ws, st_plan *p)
+{
+	double t0;
+
+	t0 = st_tic();
+	X(execute)(p->plan);
+	ws->stats.counts[COUNT_FFTS]++;
+	st_toc(&ws->stats, TIME_FFT, t0);
+}
+
+/* Forward part of the Stockwell transform: FFT of the real array data,
+followed by the Hilbert transform. Return the mean of data and set H to the
+len / 2 + 1 non-negative frequencies of the analytic signal, which are
+stored in the workspace. */
+
+static double F(st_forward)(st_workspace *ws, int len, enum PLANNER planner,
+	REAL *data, X(complex) **H)
+{
+	int i, l2;
+	double s;
+	REAL *h;
+	st_plan *p1;
+
+	/* Get the plan from the workspace cache, since using the same
+	lengths again is a very common case. The forward transform of the
+	real input only needs the non-negative half of the spectrum. */
+
+	p1 = st_get_plan(ws, PLAN_R2C, len, PREC, planner);
+	h = p1->in;
+	*H = p1->out;
+
+	/* Copy the input. Also compute the mean. */
+
+	s = 0.;
+	for (i = 0; i < len; i++) {
+		h[i] = data[i];
+		s += data[i];
+	}
+	s /= len;
+
+	/* FFT. */
+
+	F(st_execute)(ws, p1); /* h -> H */
+
+	/* Hilbert transform. The upper half-circle gets multiplied by
+	two, and the lower half-circle, which is not computed by the
+	real-to-complex transform, is zero. The real axis is left alone. */
+
+	l2 = (len + 1) / 2;
+	for (i = 1; i < l2; i++) {
+		(*H)[i][0] *= 2.;
+		(*H)[i][1] *= 2.;
+	}
+	return s;
+}
+
+/* Multiply the analytic spectrum H with the window g of row n, whose
+half-width w and values are given by st_window(), into the input of the
+backward plan p2, whose input negative frequencies must be zero, and inverse
+FFT it. The row, not yet divided by len, is in the output of p2. */
+
+static void F(st_apply)(st_workspace *ws, double *g, int len, int n, int w,
+	X(complex) *H, st_plan *p2)
+{
+	int i, k, m, l2;
+	double s;
+	X(complex) *G;
+
+	G = p2->in;
+	l2 = len / 2 + 1;
+
+	/* The window is centered on frequency n. Negative frequencies
+	wrap around. */
+
+	if (2 * w + 1 >= len) {
+		/* The support covers the whole spectrum. */
+		k = ((len - n) % len + len) % len;
+		for (i = 0; i < l2; i++) {
+			s = g[k <= len / 2 ? k : len - k];
+			G[i][0] = H[i][0] * s;
+			G[i][1] = H[i][1] * s;
+			if (++k == len) k = 0;
+		}
+	} else {
+		/* Only the bins within the support are nonzero. */
+		memset(G, 0, sizeof(X(complex)) * l2);
+		k = ((n - w) % len + len) % len;
+		for (m = -w; m <= w; m++) {
+			if (k < l2) {
+				s = g[m < 0 ? -m : m];
+				G[k][0] = H[k][0] * s;
+				G[k][1] = H[k][1] * s;
+			}
+			if (++k == len) k = 0;
+		}
+	}
+
+	/* Inverse FFT the result to get the row. */
+
+	F(st_execute)(ws, p2); /* G -> h */
+}
+
+/* Compute row n of the Stockwell transform into p, in the output format
+(see st_store()), from the analytic spectrum H and the mean of the data (see
+st_forward()). p2 is the backward plan of length len, whose input negative
+frequencies must be zero. */
+
+static void F(st_row)(st_workspace *ws, int len, int n, double gamma,
+	enum WINDOW window_code, double tol, enum OUTPUT output, double mean,
+	X(complex) *H, st_plan *p2, REAL *p)
+{
+	int w;
+	double t0, *g;
+	REAL *q;
+
+	/* The row for n == 0 contains the mean. */
+
+	if (n == 0) {
+		t0 = st_tic();
+		q = F(st_store_mean)(p, len, mean, output);
+		st_stored(ws, t0, sizeof(REAL) * (q - p));
+		return;
+	}
+
+	/* Other rows contain the inverse FFT of the spectrum
+	multiplied with the FFT of scaled gaussians. */
+
+	g = st_window(ws, len, n, gamma, window_code, tol, &w);
+	F(st_apply)(ws, g, len, n, w, H, p2);
+	t0 = st_tic();
+	q = F(st_store)(p, p2->out, len, 1. / len, output);
+	st_stored(ws, t0, sizeof(REAL) * (q - p));
+}
+
+/* Compute nrows rows of the Stockwell transform into result. If rows is
+NULL, the rows are lo, lo + 1, ..., lo + nrows - 1; otherwise, they are
+given by the array rows. */
+
+static void F(st_compute)(st_workspace *ws, int len, int nrows, const int *rows,
+	int lo, double gamma, enum WINDOW window_code, double tol,
+	enum OUTPUT output, enum PLANNER planner, REAL *data, REAL *result)
+{
+	int j, l2;
+	size_t stride;
+	double mean;
+	st_plan *p2;
+	X(complex) *H;
+
+	/* Forward transform, and plan for the inverse transform of
+	each row. */
+
+	mean = F(st_forward)(ws, len, planner, data, &H);
+	p2 = st_get_plan(ws, PLAN_BACKWARD, len, PREC, planner);
+	st_window_buffer(ws, len);
+	l2 = len / 2 + 1;
+	memset((X(complex) *)p2->in + l2, 0, sizeof(X(complex)) * (len - l2));
+
+	/* Fill in rows of the result. */
+
+	stride = (output == OUT_COMPLEX ? 2 : 1) * (size_t)len;
+	for (j = 0; j < nrows; j++) {
+		F(st_row)(ws, len, rows ? rows[j] : lo + j, gamma, window_code, tol,
+			output, mean, H, p2, result + stride * j);
+	}
+	st_cache_trim(ws);
+}
+
+/* Stockwell transform of the real array data. The len argument is the
+number of time points, and it need not be a power of two. The lo and hi
+arguments specify the range of frequencies to return, in samples, with
+0 <= lo <= hi <= len / 2. The result is returned in the complex array
+result, which must be preallocated, with n rows and len columns, where n is
+hi - lo + 1 (len / 2 + 1 for the full range of frequencies). The window of
+each row is only evaluated and applied where it is larger than tol times its
+peak value; if tol is zero, it is applied to the whole spectrum. The output argument selects what
+is stored for each sample: the complex value, or a real array with its
+amplitude, power, power in dB (10 log10 of the power) or phase. The planner
+argument sets the effort spent by FFTW to optimize the plans, when they are
+first created. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(st)(st_workspace *ws, int len, int lo, int hi, double gamma, enum WINDOW window_code, double tol, enum OUTPUT output, enum PLANNER planner, REAL *data, REAL *result)
+{
+	F(st_compute)(ws, len, hi - lo + 1, NULL, lo, gamma, window_code, tol,
+		output, planner, data, result);
+}
+
+/* Stockwell transform of the real array data, for an arbitrary set of
+frequencies. Same as st(), but the nrows frequencies to return, in samples,
+are given by the array rows (see st_freq()), in any order. The result must
+have nrows rows and len columns. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(st_rows)(st_workspace *ws, int len, int nrows, int *rows, double gamma, enum WINDOW window_code, double tol, enum OUTPUT output, enum PLANNER planner, REAL *data, REAL *result)
+{
+	F(st_compute)(ws, len, nrows, rows, 0, gamma, window_code, tol, output,
+		planner, data, result);
+}
+
+/* Reductions of the Stockwell transform of the real array data, for the
+frequencies from lo to hi (see st()), computed row by row, so that the
+Stockwell transform is never stored. Each output is only computed if it is
+not NULL: spectrum, with hi - lo + 1 values, is the time average of the
+amplitude of each row; peak, with len values, is the frequency of the
+largest amplitude at each time (the lowest one, in case of ties); energy,
+with nbands rows and len columns, is the power summed over the frequencies
+of each band at each time. The bands are given by the array bands of
+nbands pairs of frequencies (lowest and highest, included), which must be
+between lo and hi. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(st_reduce)(st_workspace *ws, int len, int lo, int hi, double gamma, enum WINDOW window_code, double tol, enum PLANNER planner, int nbands, int *bands, REAL *data, REAL *spectrum, int *peak, REAL *energy)
+{
+	int i, b, n, l2;
+	double mean, s;
+	REAL *row, *e, *peak_power;
+	st_plan *p2;
+	X(complex) *H;
+
+	/* Forward transform, and plan for the inverse transform of
+	each row. */
+
+	mean = F(st_forward)(ws, len, planner, data, &H);
+	p2 = st_get_plan(ws, PLAN_BACKWARD, len, PREC, planner);
+	st_window_buffer(ws, len);
+	l2 = len / 2 + 1;
+	memset((X(complex) *)p2->in + l2, 0, sizeof(X(complex)) * (len - l2));
+
+	/* Buffers for the power of one row and the largest power at each
+	time. */
+
+	row = (REAL *)malloc(sizeof(REAL) * len);
+	peak_power = peak ? (REAL *)malloc(sizeof(REAL) * len) : NULL;
+	if (energy) {
+		memset(energy, 0, sizeof(REAL) * (size_t)nbands * len);
+	}
+
+	for (n = lo; n <= hi; n++) {
+		F(st_row)(ws, len, n, gamma, window_code, tol, OUT_POWER, mean,
+			H, p2, row);
+		if (spectrum) {
+			s = 0.;
+			for (i = 0; i < len; i++) {
+				s += sqrt(row[i]);
+			}
+			spectrum[n - lo] = s / len;
+		}
+		if (peak) {
+			for (i = 0; i < len; i++) {
+				if (n == lo || row[i] > peak_power[i]) {
+					peak_power[i] = row[i];
+					peak[i] = n;
+				}
+			}
+		}
+		if (energy) {
+			for (b = 0; b < nbands; b++) {
+				if (n < bands[2 * b] || n > bands[2 * b + 1]) continue;
+				e = energy + (size_t)len * b;
+				for (i = 0; i < len; i++) {
+					e[i] += row[i];
+				}
+			}
+		}
+	}
+	free(row);
+	free(peak_power);
+	st_cache_trim(ws);
+}
+
+/* Multitaper Stockwell power of the real array data: the average, over
+ntapers tapers, of the power of the Stockwell transform of data multiplied
+with each taper. The tapers are stored one after the other in the array
+tapers, each of length len. The forward FFTs of all the tapered copies are
+computed first, then the window of each row is evaluated once and applied to
+all of them, and the power is accumulated in the row of result, so that only
+one row of each transform is in memory at a time. The lo and hi arguments
+must be between 0 and len / 2. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(st_multitaper)(st_workspace *ws, int len, int lo, int hi, double gamma, enum WINDOW window_code, double tol, enum PLANNER planner, int ntapers, REAL *tapers, REAL *data, REAL *result)
+{
+	int i, j, n, w, l2;
+	double s, re, im, scale;
+	REAL *tapered, *p, *taper;
+	double *means, *g;
+	st_plan *p2;
+	X(complex) *H, *spec, *out;
+
+	/* Analytic spectra of the tapered copies of the data. The spectrum
+	returned by st_forward() is in the workspace, so it is copied before
+	the next taper. */
+
+	l2 = len / 2 + 1;
+	tapered = (REAL *)malloc(sizeof(REAL) * len);
+	means = (double *)malloc(sizeof(double) * ntapers);
+	spec = (X(complex) *)malloc(sizeof(X(complex)) * (size_t)ntapers * l2);
+	for (j = 0; j < ntapers; j++) {
+		taper = tapers + (size_t)len * j;
+		for (i = 0; i < len; i++) {
+			tapered[i] = data[i] * taper[i];
+		}
+		means[j] = F(st_forward)(ws, len, planner, tapered, &H);
+		memcpy(spec + (size_t)l2 * j, H, sizeof(X(complex)) * l2);
+	}
+	free(tapered);
+
+	/* Plan for the inverse transform of each row. */
+
+	p2 = st_get_plan(ws, PLAN_BACKWARD, len, PREC, planner);
+	st_window_buffer(ws, len);
+	memset((X(complex) *)p2->in + l2, 0, sizeof(X(complex)) * (len - l2));
+	out = p2->out;
+
+	scale = 1. / ((double)len * len);
+	p = result;
+	for (n = lo; n <= hi; n++, p += len) {
+
+		/* The row for n == 0 contains the power of the mean. */
+
+		if (n == 0) {
+			s = 0.;
+			for (j = 0; j < ntapers; j++) {
+				s += means[j] * means[j];
+			}
+			s /= ntapers;
+			for (i = 0; i < len; i++) {
+				p[i] = s;
+			}
+			continue;
+		}
+
+		/* The same window is applied to the spectrum of each
+		taper, and the power of the rows is summed. */
+
+		g = st_window(ws, len, n, gamma, window_code, tol, &w);
+		memset(p, 0, sizeof(REAL) * len);
+		for (j = 0; j < ntapers; j++) {
+			F(st_apply)(ws, g, len, n, w, spec + (size_t)l2 * j,
+				p2);
+			for (i = 0; i < len; i++) {
+				re = out[i][0];
+				im = out[i][1];
+				p[i] += (re * re + im * im) * scale;
+			}
+		}
+		for (i = 0; i < len; i++) {
+			p[i] /= ntapers;
+		}
+	}
+	free(means);
+	free(spec);
+	st_cache_trim(ws);
+}
+
+/* Decimated Stockwell transform of the real array data. Each row is
+band-limited to the support of its window (see st()), so it can be
+computed with an inverse FFT restricted to that band, at a reduced length.
+A row of length m is sampled every len / m input samples (the first
+sample is at time 0). If nout is positive, all the rows have length nout,
+which must not be smaller than their bandwidth (see
+st_decimated_lengths()). Otherwise, each row has its own length, given by
+st_decimated_lengths(), and the rows are stored one after the other in the
+array result, in the output format (see st()). The lo and hi arguments must
+be between 0 and len / 2. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(st_decimated)(st_workspace *ws, int len, int lo, int hi, double gamma, enum WINDOW window_code, double tol, int nout, enum OUTPUT output, enum PLANNER planner, REAL *data, REAL *result)
+{
+	int i, k, m, n, w, a, b;
+	double mean, s, t0, *g;
+	REAL *p, *q;
+	st_plan *p2;
+	X(complex) *H, *G, *out;
+
+	mean = F(st_forward)(ws, len, planner, data, &H);
+	st_window_buffer(ws, len);
+	p = result;
+	for (n = lo; n <= hi; n++) {
+		m = nout > 0 ? nout : st_row_length(window_code, n, gamma, tol, len);
+
+		/* The row for n == 0 contains the mean. */
+
+		if (n == 0) {
+			t0 = st_tic();
+			q = F(st_store_mean)(p, m, mean, output);
+			st_stored(ws, t0, sizeof(REAL) * (q - p));
+			p = q;
+			continue;
+		}
+
+		/* Multiply the band of the spectrum with the window and wrap
+		it into the input of an inverse FFT of length m. Since the
+		band is not larger than m, the bins do not overlap. */
+
+		g = st_window(ws, len, n, gamma, window_code, tol, &w);
+		st_row_band(window_code, n, gamma, tol, len, &a, &b);
+		p2 = st_get_plan(ws, PLAN_BACKWARD, m, PREC, planner);
+		G = p2->in;
+		out = p2->out;
+		memset(G, 0, sizeof(X(complex)) * m);
+		for (k = a; k <= b; k++) {
+			i = k % m;
+			s = g[k < n ? n - k : k - n];
+			G[i][0] = H[k][0] * s;
+			G[i][1] = H[k][1] * s;
+		}
+
+		/* The inverse FFT gives the row at times len / m * i. */
+
+		F(st_execute)(ws, p2); /* G -> h */
+		t0 = st_tic();
+		q = F(st_store)(p, out, m, 1. / len, output);
+		st_stored(ws, t0, sizeof(REAL) * (q - p));
+		p = q;
+	}
+	st_cache_trim(ws);
+}
+
+/* Sum the row p of frequency n across time, multiplying by the complex
+exponential factor exp(-2 pi i n i / len) to perform the frequency shift
+required for the inverse. The factor for time i is the twiddle factor
+n * i modulo len (see st_twiddle_table()), whose index is updated
+incrementally. The sum is returned in h. */
+
+static void F(ist_sum)(int len, int n, const double *tw, const REAL *p,
+	double *h)
+{
+	int i, k;
+	double hr = 0., hi = 0.;
+
+	k = 0;
+	for (i = 0; i < len; i++) {
+		double dr, di, fr, fi;
+		dr = *p++;
+		di = *p++;
+		fr = tw[2 * k];
+		fi = tw[2 * k + 1];
+		hr += dr * fr - di * fi;
+		hi += dr * fi + di * fr;
+		k += n;
+		if (k >= len) k -= len;
+	}
+	h[0] = hr;
+	h[1] = hi;
+}
+
+/* Last part of the inverse Stockwell transform: invert the Hilbert
+transform of the len / 2 + 1 non-negative frequencies in the input of the
+backward plan p2, and inverse FFT them into result. */
+
+static void F(ist_finish)(st_workspace *ws, int len, st_plan *p2,
+	REAL *result)
+{
+	int i, l2;
+	double t0;
+	REAL *p;
+	X(complex) *H, *out;
+
+	H = p2->in;
+	out = p2->out;
+
+	/* Invert the Hilbert transform. */
+
+	l2 = (len + 1) / 2;
+	for (i = 1; i < l2; i++) {
+		H[i][0] /= 2.;
+		H[i][1] /= 2.;
+	}
+	l2 = len / 2 + 1;
+	for (i = l2; i < len; i++) {
+		H[i][0] = H[len - i][0];
+		H[i][1] = -H[len - i][1];
+	}
+
+	/* Inverse FFT. */
+
+	F(st_execute)(ws, p2); /* H -> h */
+	t0 = st_tic();
+	p = result;
+	for (i = 0; i < len; i++) {
+		*p++ = out[i][0] / len;
+	}
+	st_stored(ws, t0, sizeof(REAL) * len);
+}
+
+/* Compute the inverse Stockwell transform of nrows rows. If rows is NULL,
+the rows are lo, lo + 1, ..., lo + nrows - 1; otherwise, they are given by
+the array rows. */
+
+static void F(ist_compute)(st_workspace *ws, int len, int nrows, const int *rows,
+	int lo, enum PLANNER planner, REAL *data, REAL *result)
+{
+	int j, n;
+	double h[2], *tw;
+	st_plan *p2;
+	X(complex) *H;
+
+	/* Get the plan and the twiddle factors from the workspace cache. */
+
+	p2 = st_get_plan(ws, PLAN_BACKWARD, len, PREC, planner);
+	tw = st_twiddle_table(ws, len);
+	H = p2->in;
+
+	/* Sum each row across time, with the frequency shift. */
+
+	memset(H, 0, sizeof(X(complex)) * len);
+	for (j = 0; j < nrows; j++) {
+		n = rows ? rows[j] : lo + j;
+		F(ist_sum)(len, n, tw, data + 2 * (size_t)len * j, h);
+		H[n][0] = h[0];
+		H[n][1] = h[1];
+	}
+	F(ist_finish)(ws, len, p2, result);
+	st_cache_trim(ws);
+}
+
+/* Inverse Stockwell transform, for the frequencies from lo to hi (see
+st()). */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(ist)(st_workspace *ws, int len, int lo, int hi, enum PLANNER planner, REAL *data, REAL *result)
+{
+	F(ist_compute)(ws, len, hi - lo + 1, NULL, lo, planner, data, result);
+}
+
+/* Inverse Stockwell transform, for an arbitrary set of frequencies, given
+by the array rows, as returned by st_rows(). The frequencies which are not
+in rows are set to zero, so the reconstruction is only approximate. If a
+frequency appears more than once, its last row is used. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(ist_rows)(st_workspace *ws, int len, int nrows, int *rows, enum PLANNER planner, REAL *data, REAL *result)
+{
+	F(ist_compute)(ws, len, nrows, rows, 0, planner, data, result);
+}
+
+/* Inverse Stockwell transform of a batch of nbatch arrays of nrows rows,
+stored one after the other in data. If rows is NULL, the rows are lo,
+lo + 1, ..., lo + nrows - 1 (see ist()); otherwise, they are given by the
+array rows (see ist_rows()). The nbatch results, of length len, are stored
+one after the other in result. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(ist_batch)(st_workspace *ws, int len, int nbatch, int nrows, int *rows, int lo, enum PLANNER planner, REAL *data, REAL *result)
+{
+	int b;
+
+	for (b = 0; b < nbatch; b++) {
+		F(ist_compute)(ws, len, nrows, rows, lo, planner,
+			data + 2 * (size_t)len * nrows * b, result + (size_t)len * b);
+	}
+}
+
+/* Callback of st_filter(), called with the frequency n, the length len and
+the complex row of the Stockwell transform, which it can modify. */
+
+typedef void (*F(st_row_fn))(int n, int len, REAL *row);
+
+/* Time-frequency filter: inverse Stockwell transform of the Stockwell
+transform of the real array data, multiplied by a mask, for the
+frequencies from lo to hi (see st() and ist()). Each row is computed,
+multiplied by its row of mask (if mask is not NULL), passed to callback (if
+it is not NULL), and summed into the inverse, so that the Stockwell
+transform is never stored. The mask is a real array with hi - lo + 1 rows
+and len columns. The lo and hi arguments must be between 0 and len / 2. The
+filtered signal, of length len, is returned in result. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(st_filter)(st_workspace *ws, int len, int lo, int hi, double gamma, enum WINDOW window_code, double tol, enum PLANNER planner, REAL *mask, F(st_row_fn) callback, REAL *data, REAL *result)
+{
+	int i, n, l2;
+	double mean, *acc, *tw;
+	REAL *row, *m;
+	st_plan *p2;
+	X(complex) *H, *G;
+
+	/* Forward transform, and plan for the inverse transform of each
+	row, which is also used for the final inverse. */
+
+	mean = F(st_forward)(ws, len, planner, data, &H);
+	p2 = st_get_plan(ws, PLAN_BACKWARD, len, PREC, planner);
+	st_window_buffer(ws, len);
+	tw = st_twiddle_table(ws, len);
+	l2 = len / 2 + 1;
+	G = p2->in;
+	memset(G + l2, 0, sizeof(X(complex)) * (len - l2));
+
+	/* Buffers for one row and for the spectrum of the inverse. */
+
+	row = (REAL *)malloc(sizeof(REAL) * 2 * len);
+	acc = (double *)calloc(2 * l2, sizeof(double));
+
+	for (n = lo; n <= hi; n++) {
+		F(st_row)(ws, len, n, gamma, window_code, tol, OUT_COMPLEX, mean,
+			H, p2, row);
+		if (mask) {
+			m = mask + (size_t)len * (n - lo);
+			for (i = 0; i < len; i++) {
+				row[2 * i] *= m[i];
+				row[2 * i + 1] *= m[i];
+			}
+		}
+		if (callback) {
+			(*callback)(n, len, row);
+		}
+		F(ist_sum)(len, n, tw, row, acc + 2 * n);
+	}
+
+	/* Inverse transform of the filtered rows. */
+
+	for (i = 0; i < l2; i++) {
+		G[i][0] = acc[2 * i];
+		G[i][1] = acc[2 * i + 1];
+	}
+	F(ist_finish)(ws, len, p2, result);
+	free(row);
+	free(acc);
+	st_cache_trim(ws);
+}
+
+/* Apply the unitary DFT (kind PLAN_FORWARD) or inverse DFT (kind
+PLAN_BACKWARD) of length w to the w values of spec starting at index a. */
+
+static void F(dost_band)(st_workspace *ws, enum PLAN_KIND kind,
+	enum PLANNER planner, X(complex) *spec, int a, int w)
+{
+	int i;
+	double s;
+	st_plan *p;
+	X(complex) *out;
+
+	/* The unitary DFT of length 1 is the identity. */
+
+	if (w == 1) return;
+	p = st_get_plan(ws, kind, w, PREC, planner);
+	out = p->out;
+	memcpy(p->in, spec + a, sizeof(X(complex)) * w);
+	F(st_execute)(ws, p);
+	s = 1. / sqrt(w);
+	for (i = 0; i < w; i++) {
+		spec[a + i][0] = out[i][0] * s;
+		spec[a + i][1] = out[i][1] * s;
+	}
+}
+
+/* Apply dost_band() to each band of the spectrum spec of length len. The
+bands are the frequency 0, the positive frequencies from 2^(p-1) to 2^p - 1
+(for p = 1, 2, ..., up to (len - 1) / 2), the same negative frequencies,
+and the Nyquist frequency (if len is even). */
+
+static void F(dost_bands)(st_workspace *ws, int len, enum PLAN_KIND kind,
+	enum PLANNER planner, X(complex) *spec)
+{
+	int a, w, kmax;
+
+	kmax = (len - 1) / 2;
+	for (a = 1; a <= kmax; a *= 2) {
+		w = 2 * a - 1 <= kmax ? a : kmax - a + 1;
+		F(dost_band)(ws, kind, planner, spec, a, w);
+		F(dost_band)(ws, kind, planner, spec, len - a - w + 1, w);
+	}
+}
+
+/* Discrete orthonormal Stockwell transform (DOST) of the real array data,
+of length len. The len complex coefficients are returned in result: the
+unitary FFT of data is computed, and each band of frequencies (see
+dost_bands()) is replaced by its unitary inverse FFT (Wang and Orchard,
+2009). The coefficients of a band of w frequencies starting at index a
+of the FFT are stored at the same indices, and sample the band at times
+len / w * j, for j = 0, ..., w - 1. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(dost)(st_workspace *ws, int len, enum PLANNER planner, REAL *data, REAL *result)
+{
+	int i;
+	double s;
+	REAL *p;
+	st_plan *p1;
+	X(complex) *in, *out;
+
+	p1 = st_get_plan(ws, PLAN_FORWARD, len, PREC, planner);
+	in = p1->in;
+	out = p1->out;
+	for (i = 0; i < len; i++) {
+		in[i][0] = data[i];
+		in[i][1] = 0.;
+	}
+	F(st_execute)(ws, p1); /* in -> out */
+	F(dost_bands)(ws, len, PLAN_BACKWARD, planner, out);
+	s = 1. / sqrt(len);
+	p = result;
+	for (i = 0; i < len; i++) {
+		*p++ = out[i][0] * s;
+		*p++ = out[i][1] * s;
+	}
+	st_cache_trim(ws);
+}
+
+/* Inverse DOST. The len complex coefficients in data are transformed back
+to the real array result, of length len (see dost()). */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(idost)(st_workspace *ws, int len, enum PLANNER planner, REAL *data, REAL *result)
+{
+	int i;
+	double s;
+	st_plan *p2;
+	X(complex) *in, *out;
+
+	p2 = st_get_plan(ws, PLAN_BACKWARD, len, PREC, planner);
+	in = p2->in;
+	out = p2->out;
+	memcpy(in, data, sizeof(X(complex)) * len);
+	F(dost_bands)(ws, len, PLAN_FORWARD, planner, in);
+	F(st_execute)(ws, p2); /* in -> out */
+	s = 1. / sqrt(len);
+	for (i = 0; i < len; i++) {
+		result[i] = out[i][0] * s;
+	}
+	st_cache_trim(ws);
+}
+
+/* Analytic signal of the real array data, multiplied by len, into the
+output of the backward plan p2. p1 is the real-to-complex plan. */
+
+static void F(hilbert_compute)(st_workspace *ws, int len, st_plan *p1,
+	st_plan *p2, REAL *data)
+{
+	int i, l2;
+	REAL *h;
+	X(complex) *H, *G;
+
+	h = p1->in;
+	H = p1->out;
+	G = p2->in;
+
+	/* Copy the input. */
+
+	memcpy(h, data, sizeof(REAL) * len);
+
+	/* FFT. */
+
+	F(st_execute)(ws, p1); /* h -> H */
+
+	/* Hilbert transform. The upper half-circle gets multiplied by
+	two, and the lower half-circle gets set to zero.  The real axis
+	is left alone. */
+
+	G[0][0] = H[0][0];
+	G[0][1] = H[0][1];
+	l2 = (len + 1) / 2;
+	for (i = 1; i < l2; i++) {
+		G[i][0] = 2. * H[i][0];
+		G[i][1] = 2. * H[i][1];
+	}
+	if (len % 2 == 0) {
+		G[l2][0] = H[l2][0];
+		G[l2][1] = H[l2][1];
+	}
+	l2 = len / 2 + 1;
+	memset(G + l2, 0, sizeof(X(complex)) * (len - l2));
+
+	/* Inverse FFT. */
+
+	F(st_execute)(ws, p2); /* G -> h */
+}
+
+/* Store the analytic signal out, multiplied by len, into p, in the output
+format: the complex signal, its envelope, its unwrapped phase, or its
+instantaneous frequency in cycles per sample, which is the gradient of the
+unwrapped phase divided by 2 pi (centered differences, and one-sided
+differences at the ends). The phase is unwrapped like numpy.unwrap(): a
+jump larger than pi between two samples is corrected by a multiple of
+2 pi. */
+
+static void F(hilbert_store)(REAL *p, X(complex) *out, int len,
+	enum HILBERT_OUTPUT output)
+{
+	int i;
+	double re, im, phase, prev, prev2, d, dd;
+
+	switch (output) {
+	case HIL_ENVELOPE:
+		for (i = 0; i < len; i++) {
+			re = out[i][0] / len;
+			im = out[i][1] / len;
+			p[i] = sqrt(re * re + im * im);
+		}
+		break;
+	case HIL_PHASE:
+	case HIL_INST_FREQ:
+		/* The unwrapped phase is kept in double precision, and the
+		differences are computed from the two previous phases. */
+		prev = prev2 = 0.;
+		for (i = 0; i < len; i++) {
+			phase = atan2(out[i][1], out[i][0]);
+			if (i > 0) {
+				d = phase - prev;
+				dd = d - 2. * M_PI * floor((d + M_PI) / (2. * M_PI));
+				if (dd == -M_PI && d > 0.) dd = M_PI;
+				phase = prev + dd;
+			}
+			if (output == HIL_PHASE) {
+				p[i] = phase;
+			} else if (i == 1) {
+				p[0] = (phase - prev) / (2. * M_PI);
+			} else if (i > 1) {
+				p[i - 1] = (phase - prev2) / (4. * M_PI);
+			}
+			prev2 = prev;
+			prev = phase;
+		}
+		if (output == HIL_INST_FREQ) {
+			p[len - 1] = len > 1 ? (prev - prev2) / (2. * M_PI) : 0.;
+		}
+		break;
+	default:
+		for (i = 0; i < len; i++) {
+			*p++ = out[i][0] / len;
+			*p++ = out[i][1] / len;
+		}
+	}
+}
+
+/* Hilbert transform of nbatch real arrays of length len, stored one after
+the other in data. The results are stored one after the other in result, in
+the output format (see hilbert_store()). The plans are shared by the whole
+batch. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(hilbert_batch)(st_workspace *ws, int len, int nbatch, enum HILBERT_OUTPUT output, enum PLANNER planner, REAL *data, REAL *result)
+{
+	int b, stride;
+	double t0;
+	st_plan *p1, *p2;
+
+	/* Get the plans from the workspace cache. */
+
+	p1 = st_get_plan(ws, PLAN_R2C, len, PREC, planner);
+	p2 = st_get_plan(ws, PLAN_BACKWARD, len, PREC, planner);
+	stride = (output == HIL_COMPLEX ? 2 : 1) * len;
+	for (b = 0; b < nbatch; b++) {
+		F(hilbert_compute)(ws, len, p1, p2, data + (size_t)len * b);
+		t0 = st_tic();
+		F(hilbert_store)(result + (size_t)stride * b, p2->out, len,
+			output);
+		st_stored(ws, t0, sizeof(REAL) * stride);
+	}
+	st_cache_trim(ws);
+}
+
+/* This does just the Hilbert transform. */
+
+#ifdef __cplusplus
+extern "C"
+#endif
+#ifdef _MSC_VER
+__declspec(dllexport)
+#endif
+void F(hilbert)(st_workspace *ws, int len, enum PLANNER planner, REAL *data, REAL *result)
+{
+	F(hilbert_batch)(ws, len, 1, HIL_COMPLEX, planner, data, result);
+}
@@ -1,2 +1,5 @@
 enum WINDOW {GAUSS, KAZEMI};
-// extern enum WINDOW window_type;
\ No newline at end of file
+enum OUTPUT {OUT_COMPLEX, OUT_AMPLITUDE, OUT_POWER, OUT_DB, OUT_PHASE};
+enum HILBERT_OUTPUT {HIL_COMPLEX, HIL_ENVELOPE, HIL_PHASE, HIL_INST_FREQ};
+// extern enum WINDOW window_type;
+typedef struct st_workspace st_workspace;
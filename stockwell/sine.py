@@ -12,6 +12,7 @@ This file is part of the Stockwell project.
     (https://www.gnu.org/licenses/gpl-3.0.html)
 """
 from ctypes import CDLL, POINTER, c_int, c_double, c_void_p
+from functools import lru_cache
 import numpy as np
 from .lib_path import get_lib_path
 
@@ -22,6 +23,12 @@ lib_sine.sine_taper.argtypes = [
     POINTER(c_double)  # d
 ]
 lib_sine.sine_taper.restype = c_void_p
+lib_sine.sine_tapers.argtypes = [
+    c_int,  # K
+    c_int,  # N
+    POINTER(c_double)  # d
+]
+lib_sine.sine_tapers.restype = c_void_p
 
 
 def sine_taper(K, N):
@@ -51,3 +58,54 @@ def sine_taper(K, N):
     result = np.zeros(N, dtype=np.double)
     lib_sine.sine_taper(K, N, result.ctypes.data_as(POINTER(c_double)))
     return result
+
+
+def _sine_tapers(K, N):
+    """Compute the first K sine tapers of length N."""
+    result = np.empty((K, N), dtype=np.double)
+    lib_sine.sine_tapers(K, N, result.ctypes.data_as(POINTER(c_double)))
+    return result
+
+
+@lru_cache(maxsize=32)
+def _cached_sine_tapers(K, N):
+    """Compute the first K sine tapers of length N, as a read-only array."""
+    result = _sine_tapers(K, N)
+    result.setflags(write=False)
+    return result
+
+
+def sine_tapers(K, N, cache=True):
+    """
+    Return the first K sine tapers of length N.
+
+    The tapers are computed in a single call to the C library.
+
+    Parameters
+    ----------
+    K : int
+        Number of tapers.
+    N : int
+        Taper length.
+    cache : bool, optional
+        If True (default), the tapers are kept in a cache keyed by
+        ``(K, N)`` (holding up to 32 banks), and the same read-only array
+        is returned for the same ``K`` and ``N``. If False, a new writable
+        array is returned.
+
+    Returns
+    -------
+    result : ndarray
+        Array of shape ``(K, N)``, whose row ``k`` is ``sine_taper(k, N)``.
+
+    Notes
+    -----
+    Riedel & Sidorenko sine tapers.
+    """
+    if not isinstance(K, int) or not isinstance(N, int):
+        raise ValueError('K and N must be integers')
+    if K <= 0 or N <= 0:
+        raise ValueError('K and N must be positive')
+    if cache:
+        return _cached_sine_tapers(K, N)
+    return _sine_tapers(K, N)
@@ -12,7 +12,12 @@ This file is part of the Stockwell project.
     (https://www.gnu.org/licenses/gpl-3.0.html)
 """
 import atexit
-from ctypes import CDLL, POINTER, c_int, c_uint, c_double, c_void_p
+import threading
+import os
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import (
+    CDLL, CFUNCTYPE, POINTER, c_int, c_uint, c_float, c_double, c_void_p,
+    c_char_p, c_size_t, c_longlong)
 import numpy as np
 from .lib_path import get_lib_path
 
@@ -20,40 +25,686 @@ lib_st = CDLL(get_lib_path('st'))
 lib_st.st_cleanup.argtypes = []
 lib_st.st_cleanup.restype = c_void_p
 atexit.register(lib_st.st_cleanup)
+lib_st.st_workspace_new.argtypes = []
+lib_st.st_workspace_new.restype = c_void_p
+lib_st.st_workspace_free.argtypes = [c_void_p]
+lib_st.st_workspace_free.restype = None
+lib_st.st_cache_set_capacity.argtypes = [c_int]
+lib_st.st_cache_set_capacity.restype = None
+lib_st.st_cache_get_capacity.argtypes = []
+lib_st.st_cache_get_capacity.restype = c_int
+lib_st.st_cache_info.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # maximum number of entries
+    POINTER(c_int),  # kinds
+    POINTER(c_int),  # lens
+    POINTER(c_int)  # precisions
+]
+lib_st.st_cache_info.restype = c_int
+lib_st.st_cache_clear.argtypes = [c_void_p]
+lib_st.st_cache_clear.restype = None
+lib_st.st_window_cache_set_capacity.argtypes = [c_size_t]
+lib_st.st_window_cache_set_capacity.restype = None
+lib_st.st_window_cache_get_capacity.argtypes = []
+lib_st.st_window_cache_get_capacity.restype = c_size_t
+lib_st.st_window_cache_bytes.argtypes = [c_void_p]
+lib_st.st_window_cache_bytes.restype = c_size_t
+lib_st.st_window_cache_total.argtypes = []
+lib_st.st_window_cache_total.restype = c_size_t
+lib_st.st_stats_set_timing.argtypes = [c_int]
+lib_st.st_stats_set_timing.restype = None
+lib_st.st_stats_get_timing.argtypes = []
+lib_st.st_stats_get_timing.restype = c_int
+lib_st.st_stats_get.argtypes = [
+    POINTER(c_longlong),  # counts
+    POINTER(c_double)  # times
+]
+lib_st.st_stats_get.restype = None
+lib_st.st_stats_reset.argtypes = []
+lib_st.st_stats_reset.restype = None
+lib_st.st_set_wisdom_file.argtypes = [c_char_p]
+lib_st.st_set_wisdom_file.restype = None
+lib_st.st_get_wisdom_file.argtypes = []
+lib_st.st_get_wisdom_file.restype = c_char_p
 lib_st.st.argtypes = [
+    c_void_p,  # workspace
     c_int,  # len
     c_int,  # lo
     c_int,  # hi
     c_double,  # gamma
     c_uint,  # window code
+    c_double,  # tol
+    c_uint,  # output
+    c_uint,  # planner
     POINTER(c_double),  # data
     POINTER(c_double)  # result
 ]
 lib_st.st.restype = c_void_p
 lib_st.ist.argtypes = [
+    c_void_p,  # workspace
     c_int,  # len
     c_int,  # lo
     c_int,  # hi
+    c_uint,  # planner
     POINTER(c_double),  # data
     POINTER(c_double)  # result
 ]
 lib_st.ist.restype = c_void_p
 lib_st.hilbert.argtypes = [
+    c_void_p,  # workspace
     c_int,  # len
+    c_uint,  # planner
     POINTER(c_double),  # data
     POINTER(c_double)  # result
 ]
 lib_st.hilbert.restype = c_void_p
+lib_st.hilbert_batch.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_int,  # nbatch
+    c_uint,  # output
+    c_uint,  # planner
+    POINTER(c_double),  # data
+    POINTER(c_double)  # result
+]
+lib_st.hilbert_batch.restype = c_void_p
+lib_st.st_rows.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_int,  # nrows
+    POINTER(c_int),  # rows
+    c_double,  # gamma
+    c_uint,  # window code
+    c_double,  # tol
+    c_uint,  # output
+    c_uint,  # planner
+    POINTER(c_double),  # data
+    POINTER(c_double)  # result
+]
+lib_st.st_rows.restype = c_void_p
+lib_st.ist_rows.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_int,  # nrows
+    POINTER(c_int),  # rows
+    c_uint,  # planner
+    POINTER(c_double),  # data
+    POINTER(c_double)  # result
+]
+lib_st.ist_rows.restype = c_void_p
+lib_st.ist_batch.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_int,  # nbatch
+    c_int,  # nrows
+    POINTER(c_int),  # rows
+    c_int,  # lo
+    c_uint,  # planner
+    POINTER(c_double),  # data
+    POINTER(c_double)  # result
+]
+lib_st.ist_batch.restype = c_void_p
+lib_st.st_reduce.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_int,  # lo
+    c_int,  # hi
+    c_double,  # gamma
+    c_uint,  # window code
+    c_double,  # tol
+    c_uint,  # planner
+    c_int,  # nbands
+    POINTER(c_int),  # bands
+    POINTER(c_double),  # data
+    POINTER(c_double),  # spectrum
+    POINTER(c_int),  # peak
+    POINTER(c_double)  # energy
+]
+lib_st.st_reduce.restype = c_void_p
+lib_st.st_multitaper.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_int,  # lo
+    c_int,  # hi
+    c_double,  # gamma
+    c_uint,  # window code
+    c_double,  # tol
+    c_uint,  # planner
+    c_int,  # ntapers
+    POINTER(c_double),  # tapers
+    POINTER(c_double),  # data
+    POINTER(c_double)  # result
+]
+lib_st.st_multitaper.restype = c_void_p
+lib_st.dost.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_uint,  # planner
+    POINTER(c_double),  # data
+    POINTER(c_double)  # result
+]
+lib_st.dost.restype = c_void_p
+lib_st.idost.argtypes = lib_st.dost.argtypes
+lib_st.idost.restype = c_void_p
+# Row callback of st_filter(): frequency index, length and complex row
+_ROW_CALLBACK = CFUNCTYPE(None, c_int, c_int, POINTER(c_double))
+_ROW_CALLBACKF = CFUNCTYPE(None, c_int, c_int, POINTER(c_float))
+lib_st.st_filter.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_int,  # lo
+    c_int,  # hi
+    c_double,  # gamma
+    c_uint,  # window code
+    c_double,  # tol
+    c_uint,  # planner
+    POINTER(c_double),  # mask
+    _ROW_CALLBACK,  # callback
+    POINTER(c_double),  # data
+    POINTER(c_double)  # result
+]
+lib_st.st_filter.restype = c_void_p
+lib_st.st_freq.argtypes = [
+    c_double,  # f
+    c_int,  # len
+    c_double  # srate
+]
+lib_st.st_freq.restype = c_int
+lib_st.st_decimated_lengths.argtypes = [
+    c_int,  # len
+    c_int,  # lo
+    c_int,  # hi
+    c_double,  # gamma
+    c_uint,  # window code
+    c_double,  # tol
+    c_int,  # nout
+    POINTER(c_int)  # lens
+]
+lib_st.st_decimated_lengths.restype = c_int
+lib_st.st_decimated.argtypes = [
+    c_void_p,  # workspace
+    c_int,  # len
+    c_int,  # lo
+    c_int,  # hi
+    c_double,  # gamma
+    c_uint,  # window code
+    c_double,  # tol
+    c_int,  # nout
+    c_uint,  # output
+    c_uint,  # planner
+    POINTER(c_double),  # data
+    POINTER(c_double)  # result
+]
+lib_st.st_decimated.restype = c_void_p
+# Single precision versions of the transforms (e.g., stf for st) take float
+# arrays instead of double arrays
+_SINGLE_ARGTYPES = {
+    POINTER(c_double): POINTER(c_float),
+    _ROW_CALLBACK: _ROW_CALLBACKF,
+}
+for _name in (
+        'st', 'st_rows', 'st_decimated', 'st_reduce', 'st_multitaper',
+        'ist', 'ist_rows', 'ist_batch', 'st_filter', 'dost', 'idost',
+        'hilbert', 'hilbert_batch'):
+    _func = getattr(lib_st, _name)
+    _funcf = getattr(lib_st, f'{_name}f')
+    _funcf.argtypes = [
+        _SINGLE_ARGTYPES.get(arg, arg) for arg in _func.argtypes
+    ]
+    _funcf.restype = _func.restype
+
+
+class _Workspace:
+    """
+    FFTW plans and work buffers owned by a single thread.
+
+    The C library releases the GIL while transforming, so each thread gets
+    its own workspace, which makes concurrent calls to :func:`st`,
+    :func:`ist` and :func:`hilbert` safe.
+    """
+
+    def __init__(self):
+        self.handle = lib_st.st_workspace_new()
+        if not self.handle:
+            raise MemoryError('unable to allocate the FFTW workspace')
+        # keep a reference, since the module globals may already be gone
+        # when the workspace is garbage collected at interpreter exit
+        self._free = lib_st.st_workspace_free
+
+    def __del__(self):
+        if getattr(self, 'handle', None):
+            self._free(self.handle)
+            self.handle = None
+
+
+_thread_local = threading.local()
+
+
+def _get_workspace():
+    """Return the workspace handle of the calling thread."""
+    try:
+        return _thread_local.workspace.handle
+    except AttributeError:
+        _thread_local.workspace = _Workspace()
+        return _thread_local.workspace.handle
+
+
+# Thread pool used for multi-channel transforms, created on first use, and
+# its number of threads. Its threads are kept alive, so that their
+# workspaces (and plans) are reused between calls, until clear_plan_cache().
+_executor = None
+_executor_size = 0
+_executor_lock = threading.Lock()
+
+
+def _get_nthreads(nthreads):
+    """Return the number of threads, checking its value."""
+    if nthreads is None:
+        return os.cpu_count() or 1
+    if not isinstance(nthreads, int) or nthreads <= 0:
+        raise ValueError('nthreads must be a positive integer or None')
+    return nthreads
+
+
+def _map_channels(func, data, result, nthreads):
+    """
+    Call ``func(data[start:stop], result[start:stop])`` on groups of channels.
+
+    The channels (first axis) are split into ``nthreads`` contiguous groups,
+    which are processed in parallel by the threads of the pool.
+    """
+    global _executor, _executor_size  # pylint: disable=global-statement
+    nthreads = min(nthreads, len(data))
+    if nthreads <= 1:
+        func(data, result)
+        return
+
+    def _run(group):
+        start, stop = group
+        func(data[start:stop], result[start:stop])
+
+    bounds = np.linspace(0, len(data), nthreads + 1).astype(int)
+    # Submit the groups while holding the lock, so that the pool cannot be
+    # replaced in between: a pool which is shut down by a later call still
+    # runs the work already submitted to it
+    with _executor_lock:
+        if _executor_size < nthreads:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(
+                max_workers=nthreads, thread_name_prefix='stockwell')
+            _executor_size = nthreads
+        futures = [
+            _executor.submit(_run, group)
+            for group in zip(bounds[:-1], bounds[1:])
+        ]
+    # wait for all the groups, and propagate any exception
+    for future in futures:
+        future.result()
+
+
+# Size of the blocks of rows computed at once by st_memmap()
+_BLOCK_BYTES = 64 * 2**20
+# Plan kinds, in the same order as enum PLAN_KIND in st.c
+_PLAN_KINDS = ('forward', 'backward', 'r2c')
+# Plan precisions, in the same order as enum PRECISION in st.c
+_PLAN_PRECISIONS = ('double', 'single')
+# Instrumentation counters and timers, in the same order as enum ST_COUNTER
+# and enum ST_TIMER in st.c
+_STATS_COUNTERS = (
+    'plan_builds', 'plan_hits', 'fft_executions', 'window_evals',
+    'window_hits', 'bytes_written')
+_STATS_TIMERS = ('plan_time', 'window_time', 'fft_time', 'store_time')
+
+
+def set_plan_cache_size(size):
+    """
+    Set the maximum number of FFTW plans cached by each thread.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of cached plans. Use 0 to disable caching.
+
+    Notes
+    -----
+    Plans are cached by length and direction, and the least recently used
+    plan is evicted when the cache is full. A transform of length n needs
+    one real-to-complex forward plan and one backward plan of length n, so
+    the default size of 16 keeps the plans for up to 8 different lengths.
+    """
+    if not isinstance(size, int):
+        raise ValueError('size must be an integer')
+    if size < 0:
+        raise ValueError('size must not be negative')
+    lib_st.st_cache_set_capacity(size)
+
+
+def set_window_cache_size(nbytes):
+    """
+    Set the maximum memory used by the windows cached by all the threads.
+
+    Parameters
+    ----------
+    nbytes : int
+        Maximum number of bytes (default 64 MiB). Use 0 to disable caching.
+
+    Notes
+    -----
+    The window values of each frequency of :func:`st` depend only on the
+    length of the data, ``win_type``, ``gamma`` and ``tol``. They are
+    cached, for each combination of these parameters, the first time they
+    are computed, so that repeated transforms with the same parameters do
+    not evaluate the windows again. Each thread keeps its own windows, but
+    ``nbytes`` bounds the memory used by the windows of all the threads,
+    including those of the thread pool of the multi-channel transforms.
+    When the cache is full, the least recently used windows of the calling
+    thread are evicted, and the windows which do not fit are computed at
+    each call. When ``nbytes`` is lowered, the windows of each thread are
+    evicted the next time it runs a transform. The cached windows are
+    released by :func:`clear_plan_cache`.
+
+    Without truncation (``tol=0``), the windows of a transform of length n
+    take about ``n**2 / 4 * 8`` bytes (32 MiB for n = 4096). With
+    truncation, they take much less.
+    """
+    if not isinstance(nbytes, int):
+        raise ValueError('nbytes must be an integer')
+    if nbytes < 0:
+        raise ValueError('nbytes must not be negative')
+    lib_st.st_window_cache_set_capacity(nbytes)
+
+
+def plan_cache_info():
+    """
+    Return information on the FFTW plans cached by the calling thread.
+
+    Returns
+    -------
+    info : dict
+        A dictionary with keys ``'size'`` (the maximum number of cached
+        plans) and ``'plans'`` (a list of ``(length, direction, precision)``
+        tuples, from the most to the least recently used plan). The
+        direction is one of ``'forward'``, ``'backward'`` or ``'r2c'``
+        (real-to-complex forward), the precision is ``'double'`` or
+        ``'single'``. The keys ``'window_cache_size'``,
+        ``'window_cache_bytes'`` and ``'window_cache_total'`` give the
+        maximum memory used by the cached windows, and the current memory
+        used by those of the calling thread and of all the threads (see
+        :func:`set_window_cache_size`).
+    """
+    handle = _get_workspace()
+    nplans = lib_st.st_cache_info(handle, 0, None, None, None)
+    kinds = np.zeros(nplans, dtype=np.intc)
+    lens = np.zeros(nplans, dtype=np.intc)
+    precs = np.zeros(nplans, dtype=np.intc)
+    lib_st.st_cache_info(
+        handle, nplans,
+        kinds.ctypes.data_as(POINTER(c_int)),
+        lens.ctypes.data_as(POINTER(c_int)),
+        precs.ctypes.data_as(POINTER(c_int)))
+    return {
+        'size': lib_st.st_cache_get_capacity(),
+        'plans': [
+            (int(length), _PLAN_KINDS[kind], _PLAN_PRECISIONS[prec])
+            for kind, length, prec in zip(kinds, lens, precs)
+        ],
+        'window_cache_size': lib_st.st_window_cache_get_capacity(),
+        'window_cache_bytes': lib_st.st_window_cache_bytes(handle),
+        'window_cache_total': lib_st.st_window_cache_total(),
+    }
+
+
+def clear_plan_cache():
+    """
+    Free the FFTW plans, buffers and windows cached by the thread.
+
+    The thread pool of the multi-channel transforms is also shut down,
+    after the transforms running on it, which frees the caches of its
+    threads. A new pool is created by the next multi-channel transform.
+    """
+    global _executor, _executor_size  # pylint: disable=global-statement
+    lib_st.st_cache_clear(_get_workspace())
+    with _executor_lock:
+        if _executor is not None:
+            # the workspaces of the threads are freed when they exit
+            _executor.shutdown(wait=True)
+            _executor = None
+            _executor_size = 0
+
+
+# Planner codes, in the same order as enum PLANNER in st.c
+_PLANNERS = {'estimate': 0, 'measure': 1, 'patient': 2}
+
+
+def _get_planner_code(planner):
+    """Return the C code for the planner effort."""
+    try:
+        return _PLANNERS[planner]
+    except KeyError as e:
+        raise ValueError(f'Unknown planner: {planner}') from e
+
+
+def set_wisdom_file(path):
+    """
+    Set the file used to load and save FFTW wisdom.
+
+    Parameters
+    ----------
+    path : str or None
+        Path to the wisdom file. If None, wisdom is not loaded nor saved.
+
+    Notes
+    -----
+    FFTW wisdom stores the result of the plan optimizations done with the
+    ``'measure'`` and ``'patient'`` planners. The wisdom file is read the
+    first time one of these planners is used, and updated each time a new
+    plan is created with them. The default wisdom file is ``~/.fftwis``.
+    """
+    if path is not None:
+        path = os.fsencode(os.path.expanduser(path))
+    lib_st.st_set_wisdom_file(path)
+
+
+# Real dtype, C function suffix and C real type for each complex dtype
+_PRECISIONS = {
+    np.dtype(np.complex128): (np.float64, '', c_double),
+    np.dtype(np.complex64): (np.float32, 'f', c_float),
+}
+
+
+def _get_precision(dtype):
+    """Return the real dtype, C suffix and C type for the complex dtype."""
+    try:
+        return _PRECISIONS[np.dtype(dtype)]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f'Unsupported dtype: {dtype}') from e
+
+
+def _get_output(out, shape, dtype):
+    """
+    Return ``out``, if it is a valid output array, or a new array.
 
+    The new array is not initialized, since the C code fills it completely.
+    """
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+    if not isinstance(out, np.ndarray):
+        raise ValueError('out must be a numpy array')
+    if out.shape != shape:
+        raise ValueError(f'out must have shape {shape}')
+    if out.dtype != dtype:
+        raise ValueError(f'out must have dtype {np.dtype(dtype)}')
+    if not out.flags.c_contiguous or not out.flags.writeable:
+        raise ValueError('out must be C-contiguous and writeable')
+    return out
+
+
+# Output formats, in the same order as enum OUTPUT in st_types.h
+_OUTPUTS = ('complex', 'amplitude', 'power', 'db', 'phase')
+
+
+def _get_output_code(output):
+    """Return the C code for the output format."""
+    try:
+        return _OUTPUTS.index(output)
+    except ValueError as e:
+        raise ValueError(f'Unknown output: {output}') from e
+
+
+# Output formats of hilbert(), in the same order as enum HILBERT_OUTPUT in
+# st_types.h
+_HILBERT_OUTPUTS = ('complex', 'envelope', 'phase', 'inst_freq')
+
+
+def _get_window_code(win_type):
+    """Return the C code for the window type."""
+    if win_type == 'gauss':
+        return 0
+    if win_type == 'kazemi':
+        return 1
+    raise ValueError(f'Unknown window type: {win_type}')
+
+
+def _get_rows(freqs, srate, npts):
+    """
+    Return the frequency indices (rows) corresponding to ``freqs``.
 
-def st(data, lo=0, hi=None, gamma=1, win_type='gauss'):
+    ``freqs`` are frequency indices if ``srate`` is None, or frequencies in
+    Hz otherwise.
+    """
+    freqs = np.atleast_1d(np.asarray(freqs))
+    if freqs.ndim != 1 or len(freqs) == 0:
+        raise ValueError('freqs must be a non-empty 1d array')
+    if srate is None:
+        if not np.issubdtype(freqs.dtype, np.integer):
+            raise ValueError(
+                'freqs must be integer indices, if srate is not given')
+        rows = freqs.astype(np.intc)
+    else:
+        if srate <= 0:
+            raise ValueError('srate must be positive')
+        rows = np.array(
+            [lib_st.st_freq(f, npts, srate) for f in freqs.astype(float)],
+            dtype=np.intc)
+    if rows.min() < 0 or rows.max() > npts // 2:
+        raise ValueError(
+            'freqs must be between 0 and the Nyquist frequency')
+    return rows
+
+
+def _next_fast_len(n):
+    """Return the smallest integer not smaller than n with factors 2..7."""
+    while True:
+        m = n
+        for factor in (2, 3, 5, 7):
+            while m % factor == 0:
+                m //= factor
+        if m == 1:
+            return n
+        n += 1
+
+
+def _get_padded_length(pad, pad_mode, npts):
+    """Return the length to which data of length npts is padded."""
+    if pad is None:
+        return npts
+    if pad != 'fast':
+        raise ValueError(f'Unknown pad: {pad}')
+    if pad_mode not in ('constant', 'reflect'):
+        raise ValueError(f'Unknown pad_mode: {pad_mode}')
+    return _next_fast_len(npts)
+
+
+def stats():
+    """
+    Return the instrumentation counters of the C library.
+
+    The counters are summed over all the threads, since the last call to
+    :func:`reset_stats`. The counters of each transform are added when it
+    ends, so the transforms which are still running in other threads are
+    not included.
+
+    Returns
+    -------
+    stats : dict
+        A dictionary with the following keys:
+
+        - ``'plan_builds'``: number of FFTW plans created;
+        - ``'plan_hits'``: number of FFTW plans found in the plan cache;
+        - ``'fft_executions'``: number of FFTs executed;
+        - ``'window_evals'``: number of window rows evaluated;
+        - ``'window_hits'``: number of window rows found in the window
+          cache (see :func:`set_window_cache_size`);
+        - ``'bytes_written'``: number of bytes of transform rows and signals
+          written (including the rows reduced on the fly by
+          :func:`st_reduce`);
+        - ``'plan_time'``, ``'window_time'``, ``'fft_time'``,
+          ``'store_time'``: time, in seconds, spent creating plans,
+          evaluating windows, executing FFTs and storing the output, only
+          measured while timing is enabled (see :func:`set_stats_timing`);
+        - ``'timing'``: whether timing is enabled.
+    """
+    counts = np.zeros(len(_STATS_COUNTERS), dtype=np.longlong)
+    times = np.zeros(len(_STATS_TIMERS), dtype=np.double)
+    lib_st.st_stats_get(
+        counts.ctypes.data_as(POINTER(c_longlong)),
+        times.ctypes.data_as(POINTER(c_double)))
+    result = {
+        name: int(count) for name, count in zip(_STATS_COUNTERS, counts)}
+    result |= {name: float(time) for name, time in zip(_STATS_TIMERS, times)}
+    result['timing'] = bool(lib_st.st_stats_get_timing())
+    return result
+
+
+def reset_stats():
+    """
+    Reset the instrumentation counters and timers (see :func:`stats`).
+
+    The counters of the transforms which are running in other threads are
+    added to the new counters when they end.
+    """
+    lib_st.st_stats_reset()
+
+
+def set_stats_timing(enabled):
+    """
+    Enable or disable the timing of the phases of the transforms.
+
+    Parameters
+    ----------
+    enabled : bool
+        Whether to measure the time spent in each phase (see
+        :func:`stats`). Timing is disabled by default, since it reads the
+        clock several times for each row. The counters are always updated.
+    """
+    lib_st.st_stats_set_timing(int(bool(enabled)))
+
+
+def get_wisdom_file():
+    """
+    Return the file used to load and save FFTW wisdom.
+
+    Returns
+    -------
+    path : str or None
+        Path to the wisdom file, or None if wisdom is not persisted.
+    """
+    path = lib_st.st_get_wisdom_file()
+    return None if path is None else os.fsdecode(path)
+
+
+def st(data, lo=0, hi=None, gamma=1, win_type='gauss', tol=0,
+       planner='estimate', freqs=None, srate=None, dtype=np.complex128,
+       out=None, output='complex', nthreads=1, pad=None,
+       pad_mode='constant'):
     """
     Return the 2d, complex Stockwell transform of the real array ``data``.
 
     Parameters
     ----------
     data : array_like
-        Input data array.
+        Input data array, 1d, or 2d with one channel per row. See Notes.
     lo : int, optional
         Lowest frequency index to return (default 0).
     hi : int, optional
@@ -63,12 +714,42 @@ def st(data, lo=0, hi=None, gamma=1, win_type='gauss'):
         Gamma parameter (default 1). See Notes.
     win_type : {'gauss', 'kazemi'}, optional
         Window type (default 'gauss'). See Notes.
+    tol : float, optional
+        Window truncation threshold, relative to the window peak
+        (default 0, no truncation). See Notes.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See Notes.
+    freqs : array_like, optional
+        Frequencies to return, as frequency indices or, if ``srate`` is
+        given, in Hz. Cannot be used together with ``lo`` and ``hi``.
+        See Notes.
+    srate : float, optional
+        Sampling rate of ``data``, in Hz, used to convert ``freqs``.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Output data type (default numpy.complex128). See Notes.
+    out : ndarray, optional
+        Preallocated, C-contiguous array where the result is stored. It
+        must have the shape and the data type of the result. See Notes.
+    output : {'complex', 'amplitude', 'power', 'db', 'phase'}, optional
+        Quantity to return for each time and frequency (default
+        'complex'). See Notes.
+    nthreads : int or None, optional
+        Number of threads used to transform the channels of a 2d ``data``
+        (default 1). If None, use the number of CPUs.
+    pad : {None, 'fast'}, optional
+        If ``'fast'``, pad ``data`` to a length for which the FFTs are
+        fast (default None, no padding). See Notes.
+    pad_mode : {'constant', 'reflect'}, optional
+        How ``data`` is padded (default 'constant', with zeros). See
+        :func:`numpy.pad`.
 
     Returns
     -------
     result : ndarray
         The Stockwell transform of ``data``. The first dimension is the
-        frequency axis, the second dimension is the time axis.
+        frequency axis, the second dimension is the time axis. For a 2d
+        ``data``, the transforms of the channels are stacked along a new
+        first dimension. If ``out`` is given, it is returned.
 
     Notes
     -----
@@ -77,6 +758,11 @@ def st(data, lo=0, hi=None, gamma=1, win_type='gauss'):
     If ``hi`` is not specified, then it will be set to n/2, where n is
     the length of ``data``.
 
+    Alternatively, an arbitrary set of frequencies (e.g., log-spaced) can
+    be selected with ``freqs``: only those rows are computed, in the given
+    order. Frequencies in Hz are rounded to the nearest frequency index
+    ``round(f * n / srate)``.
+
     The parameter ``gamma`` (default 1) can be used to tune the time and
     frequency resolutions of the S-transform. It represents the number of
     Fourier sinusoidal periods within one standard deviation of the
@@ -87,10 +773,271 @@ def st(data, lo=0, hi=None, gamma=1, win_type='gauss'):
 
     Two ``win_type`` are available:
     ``'gauss'`` (default) and ``'kazemi'`` (Kazemi, 2014).
+
+    If ``tol`` is positive, the window of each frequency is only evaluated
+    and applied where it is larger than ``tol``, which is much faster for
+    low frequencies, where the window is narrow. With the Gaussian window,
+    ``tol=1e-16`` gives the same results, within numerical precision.
+
+    The ``planner`` effort is used when the FFTW plans for a given length
+    are first created. ``'measure'`` and ``'patient'`` take longer to plan,
+    but give faster transforms on the following calls with the same length.
+    Their results are saved as FFTW wisdom (see :func:`set_wisdom_file`).
+
+    With ``dtype=numpy.complex64``, the transform is computed in single
+    precision: it is faster and uses half the memory, with a relative
+    accuracy of about 1e-6.
+
+    When transforming many signals of the same length, passing the same
+    ``out`` array to each call avoids allocating a new result each time.
+    To compute transforms larger than the available memory, see
+    :func:`st_memmap`.
+
+    With ``output`` other than ``'complex'``, the result is real (float64,
+    or float32 if ``dtype=numpy.complex64``) and contains, respectively,
+    the amplitude ``abs(S)``, the power ``abs(S)**2``, the power in dB
+    ``10 * log10(abs(S)**2)`` or the phase ``angle(S)`` of the Stockwell
+    transform ``S``. This is computed while each row is written, which is
+    faster and uses less memory than computing the complex transform first.
+
+    If ``data`` is a 2d array of shape ``(nchannels, ntimes)``, each row
+    is transformed independently, and the result is a single array of shape
+    ``(nchannels, nfreqs, ntimes)``. The channels are spread over
+    ``nthreads`` threads, each one with its own FFTW plans and buffers.
+
+    The FFTs are much slower when n has large prime factors. With
+    ``pad='fast'``, ``data`` is padded at the end to the next length m
+    whose only prime factors are 2, 3, 5 and 7, the transform is computed
+    for that length, and only its first n columns are returned. The rows
+    are still selected by ``lo`` and ``hi`` (or ``freqs``) on the frequency
+    grid of n: frequency index k is computed at the nearest index of the
+    grid of m, ``round(k * m / n)``. The padded samples slightly change
+    the transform near the end of the data, and the row of frequency 0
+    contains the mean of the padded data.
     """
-    data = np.atleast_1d(np.ascontiguousarray(data, dtype=np.double))
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=real_dtype))
+    if data.ndim > 2:
+        raise ValueError('data must be a scalar, a 1d or a 2d array')
+    ntimes = data.shape[-1]
+    if data.size == 0:
+        raise ValueError('data must not be empty')
+    nthreads = _get_nthreads(nthreads)
+    rows = None
+    if freqs is not None:
+        if lo != 0 or hi is not None:
+            raise ValueError('freqs cannot be used together with lo and hi')
+        rows = _get_rows(freqs, srate, ntimes)
+        nfreqs = len(rows)
+    else:
+        if hi is None:
+            hi = ntimes // 2
+        if not isinstance(hi, int) or not isinstance(lo, int):
+            raise ValueError('hi and lo must be integers')
+        if not 0 <= lo <= hi <= ntimes // 2:
+            raise ValueError(
+                'lo and hi must be such that 0 <= lo <= hi <= n/2')
+        nfreqs = int(hi - lo + 1)
+    win_code = _get_window_code(win_type)
+    if not 0 <= tol < 1:
+        raise ValueError('tol must be between 0 and 1')
+    planner_code = _get_planner_code(planner)
+    output_code = _get_output_code(output)
+    npad = _get_padded_length(pad, pad_mode, ntimes)
+    if npad != ntimes:
+        # Map the frequency indices to the grid of the padded length
+        if rows is None:
+            rows = np.arange(lo, hi + 1)
+        rows = np.minimum(np.rint(rows * npad / ntimes), npad // 2)
+        rows = rows.astype(np.intc)
+    result = _get_output(
+        out, data.shape[:-1] + (nfreqs, ntimes),
+        dtype if output == 'complex' else real_dtype)
+
+    def _st(group_data, group_result):
+        handle = _get_workspace()
+        # Transform of one padded channel, which is then cropped
+        padded = None
+        if npad != ntimes:
+            padded = np.empty((nfreqs, npad), dtype=group_result.dtype)
+        for channel_data, channel_result in zip(group_data, group_result):
+            channel_out = channel_result
+            if padded is not None:
+                channel_data = np.pad(
+                    channel_data, (0, npad - ntimes), mode=pad_mode)
+                channel_out = padded
+            if rows is not None:
+                getattr(lib_st, f'st_rows{suffix}')(
+                    handle, npad, nfreqs,
+                    rows.ctypes.data_as(POINTER(c_int)),
+                    gamma, win_code, tol, output_code, planner_code,
+                    channel_data.ctypes.data_as(POINTER(c_real)),
+                    channel_out.ctypes.data_as(POINTER(c_real)))
+            else:
+                getattr(lib_st, f'st{suffix}')(
+                    handle, npad, lo, hi, gamma, win_code, tol,
+                    output_code, planner_code,
+                    channel_data.ctypes.data_as(POINTER(c_real)),
+                    channel_out.ctypes.data_as(POINTER(c_real)))
+            if padded is not None:
+                channel_result[...] = padded[:, :ntimes]
+
+    _map_channels(
+        _st, data.reshape(-1, ntimes), result.reshape(-1, nfreqs, ntimes),
+        nthreads)
+    return result
+
+
+def st_memmap(filename, data, lo=0, hi=None, gamma=1, win_type='gauss',
+              tol=0, planner='estimate', freqs=None, srate=None,
+              dtype=np.complex128, output='complex', block_size=None):
+    """
+    Compute the Stockwell transform of ``data`` into a ``.npy`` file.
+
+    Parameters
+    ----------
+    filename : str or path-like
+        Name of the ``.npy`` file to create. An existing file is
+        overwritten.
+    data : array_like
+        Input data array.
+    lo : int, optional
+        Lowest frequency index to return (default 0).
+    hi : int, optional
+        Highest frequency index to return (default n/2), where n is the
+        length of ``data``.
+    gamma : float, optional
+        Gamma parameter (default 1). See :func:`st`.
+    win_type : {'gauss', 'kazemi'}, optional
+        Window type (default 'gauss'). See :func:`st`.
+    tol : float, optional
+        Window truncation threshold (default 0). See :func:`st`.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    freqs : array_like, optional
+        Frequencies to return. See :func:`st`.
+    srate : float, optional
+        Sampling rate of ``data``, in Hz, used to convert ``freqs``.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Output data type (default numpy.complex128). See :func:`st`.
+    output : {'complex', 'amplitude', 'power', 'db', 'phase'}, optional
+        Quantity to return for each time and frequency (default
+        'complex'). See :func:`st`.
+    block_size : int, optional
+        Number of frequencies (rows) computed and written to disk at once
+        (default: about 64 MB of rows).
+
+    Returns
+    -------
+    result : numpy.memmap
+        The Stockwell transform of ``data``, memory-mapped to ``filename``.
+        It can be opened again with ``numpy.load(filename, mmap_mode='r')``.
+
+    Notes
+    -----
+    The transform is computed in blocks of ``block_size`` rows, which are
+    written directly into the memory-mapped file and flushed to disk, so
+    that transforms larger than the available memory can be computed.
+    """
+    real_dtype, _, _ = _get_precision(dtype)
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=real_dtype))
+    if data.ndim != 1:
+        raise ValueError('data must be a scalar or a 1d array')
+    ntimes = len(data)
+    if ntimes == 0:
+        raise ValueError('data must not be empty')
+    if freqs is not None:
+        if lo != 0 or hi is not None:
+            raise ValueError('freqs cannot be used together with lo and hi')
+        rows = _get_rows(freqs, srate, ntimes)
+    else:
+        if hi is None:
+            hi = ntimes // 2
+        if not isinstance(hi, int) or not isinstance(lo, int):
+            raise ValueError('hi and lo must be integers')
+        rows = _get_rows(np.arange(lo, hi + 1), None, ntimes)
+    # Check the other parameters before creating the file
+    _get_window_code(win_type)
+    if not 0 <= tol < 1:
+        raise ValueError('tol must be between 0 and 1')
+    _get_planner_code(planner)
+    _get_output_code(output)
+    out_dtype = np.dtype(dtype if output == 'complex' else real_dtype)
+    if block_size is None:
+        block_size = max(1, _BLOCK_BYTES // (out_dtype.itemsize * ntimes))
+    if not isinstance(block_size, int) or block_size <= 0:
+        raise ValueError('block_size must be a positive integer')
+    result = np.lib.format.open_memmap(
+        filename, mode='w+', dtype=out_dtype, shape=(len(rows), ntimes))
+    for start in range(0, len(rows), block_size):
+        block_rows = rows[start:start + block_size]
+        st(data, gamma=gamma, win_type=win_type, tol=tol, planner=planner,
+           freqs=block_rows, dtype=dtype, output=output,
+           out=result[start:start + len(block_rows)])
+        result.flush()
+    return result
+
+
+def st_reduce(data, reductions, lo=0, hi=None, gamma=1, win_type='gauss',
+              tol=0, planner='estimate', bands=None, dtype=np.complex128):
+    """
+    Return reductions of the Stockwell transform of the real array ``data``.
+
+    The reductions are computed row by row, without storing the Stockwell
+    transform, so that the memory used is proportional to the length of
+    ``data``.
+
+    Parameters
+    ----------
+    data : array_like
+        Input data array.
+    reductions : str or sequence of str
+        Reduction(s) to compute, among:
+
+        - ``'spectrum'``: time-averaged amplitude of each frequency,
+          ``abs(S).mean(axis=1)``, with ``hi - lo + 1`` values;
+        - ``'peak'``: frequency index of the largest amplitude at each
+          time, ``lo + abs(S).argmax(axis=0)``, with n values;
+        - ``'bands'``: power summed over the frequencies of each band of
+          ``bands``, at each time, with shape ``(len(bands), n)``.
+
+        where ``S`` is ``st(data, lo, hi)`` and n is the length of ``data``.
+    lo : int, optional
+        Lowest frequency index to use (default 0).
+    hi : int, optional
+        Highest frequency index to use (default n/2).
+    gamma : float, optional
+        Gamma parameter (default 1). See :func:`st`.
+    win_type : {'gauss', 'kazemi'}, optional
+        Window type (default 'gauss'). See :func:`st`.
+    tol : float, optional
+        Window truncation threshold (default 0). See :func:`st`.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    bands : sequence of (int, int), optional
+        Lowest and highest frequency indices (included) of each band,
+        between ``lo`` and ``hi``. Required for the ``'bands'`` reduction.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Precision of the computation (default numpy.complex128). The
+        spectrum and the band powers are float64 or float32, respectively.
+
+    Returns
+    -------
+    result : ndarray or tuple of ndarray
+        The reduction, if ``reductions`` is a string, or a tuple with one
+        array per reduction, in the same order.
+    """
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    if isinstance(reductions, str):
+        names = (reductions,)
+    else:
+        names = tuple(reductions)
+    for name in names:
+        if name not in ('spectrum', 'peak', 'bands'):
+            raise ValueError(f'Unknown reduction: {name}')
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=real_dtype))
     if data.ndim != 1:
-        raise ValueError('x must be a scalar or a 1d array')
+        raise ValueError('data must be a scalar or a 1d array')
     ntimes = len(data)
     if ntimes == 0:
         raise ValueError('data must not be empty')
@@ -98,39 +1045,267 @@ def st(data, lo=0, hi=None, gamma=1, win_type='gauss'):
         hi = ntimes // 2
     if not isinstance(hi, int) or not isinstance(lo, int):
         raise ValueError('hi and lo must be integers')
-    nfreqs = int(hi - lo + 1)
-    if win_type == 'gauss':
-        win_code = 0
-    elif win_type == 'kazemi':
-        win_code = 1
-    else:
-        raise ValueError(f'Unknown window type: {win_type}')
-    result = np.zeros((nfreqs, ntimes), dtype=np.complex128)
-    lib_st.st(
-        ntimes, lo, hi, gamma, win_code,
-        data.ctypes.data_as(POINTER(c_double)),
-        result.ctypes.data_as(POINTER(c_double)))
+    if not 0 <= lo <= hi <= ntimes // 2:
+        raise ValueError('lo and hi must be such that 0 <= lo <= hi <= n/2')
+    win_code = _get_window_code(win_type)
+    if not 0 <= tol < 1:
+        raise ValueError('tol must be between 0 and 1')
+    planner_code = _get_planner_code(planner)
+    if 'bands' in names:
+        if bands is None:
+            raise ValueError('bands must be given for the bands reduction')
+        bands = np.ascontiguousarray(bands, dtype=np.intc)
+        if bands.ndim != 2 or bands.shape[1] != 2 or len(bands) == 0:
+            raise ValueError('bands must be a sequence of (lo, hi) pairs')
+        valid = (lo <= bands[:, 0]) & (bands[:, 0] <= bands[:, 1])
+        valid &= bands[:, 1] <= hi
+        if not np.all(valid):
+            raise ValueError('bands must be between lo and hi')
+    results = {
+        'spectrum': np.empty(hi - lo + 1, dtype=real_dtype),
+        'peak': np.empty(ntimes, dtype=np.intc),
+        'bands': np.empty(
+            (0 if bands is None else len(bands), ntimes), dtype=real_dtype),
+    }
+
+    def _pointer(name, ctype):
+        if name not in names:
+            return None
+        return results[name].ctypes.data_as(POINTER(ctype))
+
+    getattr(lib_st, f'st_reduce{suffix}')(
+        _get_workspace(), ntimes, lo, hi, gamma, win_code, tol, planner_code,
+        len(results['bands']),
+        None if bands is None else bands.ctypes.data_as(POINTER(c_int)),
+        data.ctypes.data_as(POINTER(c_real)),
+        _pointer('spectrum', c_real), _pointer('peak', c_int),
+        _pointer('bands', c_real))
+    if isinstance(reductions, str):
+        return results[reductions]
+    return tuple(results[name] for name in names)
+
+
+def st_multitaper(data, ntapers=3, lo=0, hi=None, gamma=1, win_type='gauss',
+                  tol=0, planner='estimate', dtype=np.complex128):
+    """
+    Return the multitaper Stockwell power of the real array ``data``.
+
+    The power of the Stockwell transform is averaged over ``ntapers`` sine
+    tapers (see :func:`stockwell.sine.sine_tapers`), which reduces its
+    variance. The forward FFT of each tapered copy of ``data`` is computed
+    once, and the window of each frequency is evaluated once and applied to
+    all the tapers, accumulating the power row by row, so that the
+    Stockwell transform of each taper is never stored.
+
+    Parameters
+    ----------
+    data : array_like
+        Input data array.
+    ntapers : int, optional
+        Number of sine tapers (default 3).
+    lo : int, optional
+        Lowest frequency index to return (default 0).
+    hi : int, optional
+        Highest frequency index to return (default n/2).
+    gamma : float, optional
+        Gamma parameter (default 1). See :func:`st`.
+    win_type : {'gauss', 'kazemi'}, optional
+        Window type (default 'gauss'). See :func:`st`.
+    tol : float, optional
+        Window truncation threshold (default 0). See :func:`st`.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Precision of the computation (default numpy.complex128). The power
+        is float64 or float32, respectively.
+
+    Returns
+    -------
+    power : ndarray
+        The average power, with the same shape as ``st(data, lo, hi)``:
+        ``np.mean([abs(st(data * tk, lo, hi))**2 for tk in tapers], axis=0)``.
+    """
+    from .sine import sine_tapers
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=real_dtype))
+    if data.ndim != 1:
+        raise ValueError('data must be a scalar or a 1d array')
+    ntimes = len(data)
+    if ntimes == 0:
+        raise ValueError('data must not be empty')
+    if not isinstance(ntapers, int) or ntapers < 1:
+        raise ValueError('ntapers must be a positive integer')
+    if hi is None:
+        hi = ntimes // 2
+    if not isinstance(hi, int) or not isinstance(lo, int):
+        raise ValueError('hi and lo must be integers')
+    if not 0 <= lo <= hi <= ntimes // 2:
+        raise ValueError('lo and hi must be such that 0 <= lo <= hi <= n/2')
+    win_code = _get_window_code(win_type)
+    if not 0 <= tol < 1:
+        raise ValueError('tol must be between 0 and 1')
+    planner_code = _get_planner_code(planner)
+    tapers = sine_tapers(ntapers, ntimes).astype(real_dtype, copy=False)
+    result = np.empty((hi - lo + 1, ntimes), dtype=real_dtype)
+    getattr(lib_st, f'st_multitaper{suffix}')(
+        _get_workspace(), ntimes, lo, hi, gamma, win_code, tol, planner_code,
+        ntapers, tapers.ctypes.data_as(POINTER(c_real)),
+        data.ctypes.data_as(POINTER(c_real)),
+        result.ctypes.data_as(POINTER(c_real)))
     return result
 
 
-def ist(data, lo=0, hi=None):
+def st_decimated(data, lo=0, hi=None, gamma=1, win_type='gauss', tol=1e-8,
+                 grid='row', ntimes=None, planner='estimate',
+                 dtype=np.complex128, output='complex'):
+    """
+    Return the decimated Stockwell transform of the real array ``data``.
+
+    Parameters
+    ----------
+    data : array_like
+        Input data array.
+    lo : int, optional
+        Lowest frequency index to return (default 0).
+    hi : int, optional
+        Highest frequency index to return (default n/2), where n is the
+        length of ``data``.
+    gamma : float, optional
+        Gamma parameter (default 1). See :func:`st`.
+    win_type : {'gauss', 'kazemi'}, optional
+        Window type (default 'gauss'). See :func:`st`.
+    tol : float, optional
+        Window truncation threshold, relative to the window peak
+        (default 1e-8). See Notes.
+    grid : {'row', 'common'}, optional
+        Time sampling of the rows (default 'row'). See Notes.
+    ntimes : int, optional
+        Number of time samples of the common grid (default: the smallest
+        number that does not alias any row). Only used if ``grid='common'``.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Output data type (default numpy.complex128). See :func:`st`.
+    output : {'complex', 'amplitude', 'power', 'db', 'phase'}, optional
+        Quantity to return for each time and frequency (default
+        'complex'). See :func:`st`.
+
+    Returns
+    -------
+    result : list of ndarray or ndarray
+        The decimated Stockwell transform of ``data``. If ``grid='row'``,
+        a list with one array per frequency. If ``grid='common'``, a 2d
+        array, whose first dimension is the frequency axis and second
+        dimension is the time axis.
+    step : ndarray or float
+        Sampling interval, in samples of ``data``, of each row (if
+        ``grid='row'``), or of the common grid (if ``grid='common'``).
+
+    Notes
+    -----
+    Each row of the Stockwell transform is band-limited to the frequencies
+    where its window is larger than ``tol``. It can therefore be computed
+    with a short inverse FFT, and sampled at a lower rate, without loss of
+    information. This reduces both the computation time and the memory
+    used by the result, especially for low frequencies and long records.
+
+    With ``grid='row'``, each row is sampled at its own rate: the number
+    of samples is the smallest power of two covering the band of the row
+    (but not more than the length of ``data``). With ``grid='common'``,
+    all the rows are sampled on the same time grid of ``ntimes`` samples.
+
+    The sample ``i`` of a row of ``m`` samples corresponds to the time
+    index ``i * n / m`` of the full Stockwell transform, where n is the
+    length of ``data``.
+    """
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=real_dtype))
+    if data.ndim != 1:
+        raise ValueError('data must be a scalar or a 1d array')
+    npts = len(data)
+    if npts == 0:
+        raise ValueError('data must not be empty')
+    if hi is None:
+        hi = npts // 2
+    if not isinstance(hi, int) or not isinstance(lo, int):
+        raise ValueError('hi and lo must be integers')
+    if not 0 <= lo <= hi <= npts // 2:
+        raise ValueError('lo and hi must be such that 0 <= lo <= hi <= n/2')
+    win_code = _get_window_code(win_type)
+    if not 0 <= tol < 1:
+        raise ValueError('tol must be between 0 and 1')
+    if grid not in ('row', 'common'):
+        raise ValueError(f'Unknown grid: {grid}')
+    planner_code = _get_planner_code(planner)
+    output_code = _get_output_code(output)
+    nfreqs = hi - lo + 1
+    lens = np.zeros(nfreqs, dtype=np.intc)
+    bandwidth = lib_st.st_decimated_lengths(
+        npts, lo, hi, gamma, win_code, tol, 0,
+        lens.ctypes.data_as(POINTER(c_int)))
+    nout = 0
+    if grid == 'common':
+        nout = bandwidth if ntimes is None else ntimes
+        if not isinstance(nout, int):
+            raise ValueError('ntimes must be an integer')
+        if nout < bandwidth:
+            raise ValueError(
+                f'ntimes must be at least {bandwidth} to avoid aliasing')
+        lens[:] = nout
+    result = np.empty(
+        int(lens.sum()), dtype=dtype if output == 'complex' else real_dtype)
+    getattr(lib_st, f'st_decimated{suffix}')(
+        _get_workspace(), npts, lo, hi, gamma, win_code, tol, nout,
+        output_code, planner_code,
+        data.ctypes.data_as(POINTER(c_real)),
+        result.ctypes.data_as(POINTER(c_real)))
+    if grid == 'common':
+        return result.reshape(nfreqs, nout), npts / nout
+    rows = np.split(result, np.cumsum(lens[:-1]))
+    return rows, npts / lens
+
+
+def ist(data, lo=0, hi=None, planner='estimate', freqs=None, srate=None,
+        dtype=np.complex128, out=None, nthreads=1):
     """
     Return the inverse Stockwell transform of the 2d, complex array ``data``.
 
     Parameters
     ----------
     data : array_like
-        Input data array, 2d and complex.
+        Input data array, 2d and complex, or 3d for a batch of arrays. See
+        Notes.
     lo : int, optional
         Lowest frequency index to use (default 0).
     hi : int, optional
         Highest frequency index to use (default n/2), where n is the number of
         time samples in ``data``.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    freqs : array_like, optional
+        Frequencies of the rows of ``data``, as frequency indices or, if
+        ``srate`` is given, in Hz (see :func:`st`). Cannot be used together
+        with ``lo`` and ``hi``.
+    srate : float, optional
+        Sampling rate, in Hz, used to convert ``freqs``.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Precision of the computation (default numpy.complex128). With
+        numpy.complex64, ``data`` is converted to complex64 and the result
+        is float32.
+    out : ndarray, optional
+        Preallocated, C-contiguous array where the result is stored, with
+        the shape of the result and the real type of ``dtype``. See
+        :func:`st`.
+    nthreads : int or None, optional
+        Number of threads used to transform a batch of arrays (default 1).
+        If None, use the number of CPUs.
 
     Returns
     -------
     result : ndarray
-        The inverse Stockwell transform of ``data``.
+        The inverse Stockwell transform of ``data``: a 1d array, or a 2d
+        array with one row per array of the batch. If ``out`` is given, it
+        is returned.
 
     Notes
     -----
@@ -140,53 +1315,358 @@ def ist(data, lo=0, hi=None):
     the number of time samples in ``data``.
     The difference between ``hi`` and ``lo`` must be equal to the number of
     frequencies in ``data`` minus 1.
+
+    If ``freqs`` is specified, its length must be equal to the number of
+    frequencies in ``data``. The missing frequencies are set to zero, so
+    the reconstruction is only approximate.
+
+    If ``data`` is a 3d array of shape ``(nbatch, nfreqs, ntimes)``, each
+    of the ``nbatch`` arrays is inverted, and the result has shape
+    ``(nbatch, ntimes)``. The batch is split over ``nthreads`` threads,
+    each one inverting its part of the batch in a single C call.
+    """
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    data = np.ascontiguousarray(data, dtype=dtype)
+    if data.ndim not in (2, 3):
+        raise ValueError('data must be a 2d or a 3d array')
+    nfreqs, ntimes = data.shape[-2:]
+    if data.size == 0:
+        raise ValueError('data must not be empty')
+    nthreads = _get_nthreads(nthreads)
+    rows = None
+    if freqs is not None:
+        if lo != 0 or hi is not None:
+            raise ValueError('freqs cannot be used together with lo and hi')
+        rows = _get_rows(freqs, srate, ntimes)
+        if nfreqs != len(rows):
+            raise ValueError(
+                'the length of freqs must be equal to the number of '
+                'frequencies in data (first dimension)'
+            )
+    else:
+        if hi is None:
+            hi = ntimes // 2
+        if not isinstance(hi, int) or not isinstance(lo, int):
+            raise ValueError('hi and lo must be integers')
+        if nfreqs != hi - lo + 1:
+            raise ValueError(
+                'the difference between hi and lo must be equal to the '
+                'number of frequencies in data (first dimension) minus 1'
+            )
+        if lo < 0 or hi > ntimes // 2:
+            raise ValueError(
+                'lo and hi must be such that 0 <= lo <= hi <= n/2')
+    planner_code = _get_planner_code(planner)
+    result = _get_output(out, data.shape[:-2] + (ntimes,), real_dtype)
+
+    def _ist(group_data, group_result):
+        getattr(lib_st, f'ist_batch{suffix}')(
+            _get_workspace(), ntimes, len(group_data), nfreqs,
+            None if rows is None else rows.ctypes.data_as(POINTER(c_int)),
+            lo, planner_code,
+            group_data.ctypes.data_as(POINTER(c_real)),
+            group_result.ctypes.data_as(POINTER(c_real)))
+
+    _map_channels(
+        _ist, data.reshape(-1, nfreqs, ntimes), result.reshape(-1, ntimes),
+        nthreads)
+    return result
+
+
+def st_filter(data, mask, lo=0, hi=None, gamma=1, win_type='gauss', tol=0,
+              planner='estimate', dtype=np.complex128):
     """
-    data = np.ascontiguousarray(data, dtype=np.complex128)
-    if data.ndim != 2:
-        raise ValueError('data must be a 2d array')
-    nfreqs, ntimes = data.shape
+    Filter the real array ``data`` in the time-frequency domain.
+
+    This is equivalent to ``ist(st(data, lo, hi) * mask, lo, hi)``, but the
+    Stockwell transform is never stored: each row is computed, filtered,
+    and summed into the inverse transform.
+
+    Parameters
+    ----------
+    data : array_like
+        Input data array.
+    mask : array_like or callable
+        Real mask, of shape ``(hi - lo + 1, n)``, by which the Stockwell
+        transform is multiplied, or function called as ``mask(row, freq)``
+        for each row of the Stockwell transform, where ``row`` is the
+        complex row and ``freq`` its frequency index. The function must
+        return the filtered row (it can also modify ``row`` in place and
+        return it). See Notes.
+    lo : int, optional
+        Lowest frequency index to use (default 0).
+    hi : int, optional
+        Highest frequency index to use (default n/2), where n is the
+        length of ``data``.
+    gamma : float, optional
+        Gamma parameter (default 1). See :func:`st`.
+    win_type : {'gauss', 'kazemi'}, optional
+        Window type (default 'gauss'). See :func:`st`.
+    tol : float, optional
+        Window truncation threshold (default 0). See :func:`st`.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Precision of the computation (default numpy.complex128). The result
+        is float64 or float32, respectively.
+
+    Returns
+    -------
+    result : ndarray
+        The filtered signal.
+
+    Notes
+    -----
+    The memory used is proportional to the length of ``data`` (plus the
+    size of ``mask``, if it is an array), instead of the size of the
+    Stockwell transform.
+
+    With a callable ``mask`` (e.g., a threshold on the amplitude of each
+    row), ``row`` is only valid during the call: the function must not keep
+    a reference to it.
+    """
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=real_dtype))
+    if data.ndim != 1:
+        raise ValueError('data must be a scalar or a 1d array')
+    ntimes = len(data)
     if ntimes == 0:
         raise ValueError('data must not be empty')
     if hi is None:
         hi = ntimes // 2
     if not isinstance(hi, int) or not isinstance(lo, int):
         raise ValueError('hi and lo must be integers')
-    if nfreqs != hi - lo + 1:
-        raise ValueError(
-            'the difference between hi and lo must be equal to the number of '
-            'frequencies in data (first dimension) minus 1'
-        )
-    result = np.zeros(ntimes, dtype=np.double)
-    lib_st.ist(
-        ntimes, lo, hi,
-        data.ctypes.data_as(POINTER(c_double)),
-        result.ctypes.data_as(POINTER(c_double)))
+    if not 0 <= lo <= hi <= ntimes // 2:
+        raise ValueError('lo and hi must be such that 0 <= lo <= hi <= n/2')
+    win_code = _get_window_code(win_type)
+    if not 0 <= tol < 1:
+        raise ValueError('tol must be between 0 and 1')
+    planner_code = _get_planner_code(planner)
+    callback_type = _ROW_CALLBACK if suffix == '' else _ROW_CALLBACKF
+    errors = []
+    if callable(mask):
+        mask_array = None
+        func = mask
+
+        def _callback(freq, length, row_pointer):
+            # exceptions cannot propagate through C: store the first one,
+            # and skip the following rows
+            if errors:
+                return
+            try:
+                row = np.ctypeslib.as_array(
+                    row_pointer, shape=(2 * length,)).view(dtype)
+                row[:] = func(row, freq)
+            except Exception as err:  # pylint: disable=broad-except
+                errors.append(err)
+
+        callback = callback_type(_callback)
+    else:
+        mask_array = np.ascontiguousarray(mask, dtype=real_dtype)
+        if mask_array.shape != (hi - lo + 1, ntimes):
+            raise ValueError(
+                f'mask must have shape {(hi - lo + 1, ntimes)}')
+        # NULL function pointer
+        callback = callback_type()
+    result = np.empty(ntimes, dtype=real_dtype)
+    getattr(lib_st, f'st_filter{suffix}')(
+        _get_workspace(), ntimes, lo, hi, gamma, win_code, tol, planner_code,
+        None if mask_array is None
+        else mask_array.ctypes.data_as(POINTER(c_real)),
+        callback,
+        data.ctypes.data_as(POINTER(c_real)),
+        result.ctypes.data_as(POINTER(c_real)))
+    if errors:
+        raise errors[0]
     return result
 
 
-def hilbert(data):
+def hilbert(data, planner='estimate', dtype=np.complex128, out=None,
+            output='complex', nthreads=1):
     """
     Return the complex Hilbert transform of the real array ``data``.
 
     Parameters
     ----------
     data : array_like
-        Input data array.
+        Input data array. It can be a 1d array, or a 2d array of shape
+        ``(ntraces, ntimes)`` whose rows are transformed independently.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Output data type (default numpy.complex128). See :func:`st`.
+    out : ndarray, optional
+        Preallocated, C-contiguous array where the result is stored. It
+        must have the shape and the data type of the result. See
+        :func:`st`.
+    output : {'complex', 'envelope', 'phase', 'inst_freq'}, optional
+        Quantity to return for each sample (default 'complex'). See Notes.
+    nthreads : int or None, optional
+        Number of threads used to transform the rows of a 2d ``data``
+        (default 1). If None, use the number of CPUs.
+
+    Returns
+    -------
+    result : ndarray
+        The Hilbert transform of ``data``, with the same shape as ``data``.
+        If ``out`` is given, it is returned.
+
+    Notes
+    -----
+    For ``output='complex'``, the result is the analytic signal ``z``.
+    The other output formats are real arrays (float64, or float32 if
+    ``dtype=numpy.complex64``), computed in C while the result is written:
+
+    - ``'envelope'``: ``abs(z)``;
+    - ``'phase'``: the unwrapped phase, ``numpy.unwrap(numpy.angle(z))``;
+    - ``'inst_freq'``: the instantaneous frequency, in cycles per sample,
+      ``numpy.gradient(numpy.unwrap(numpy.angle(z))) / (2 * numpy.pi)``.
+      Multiply it by the sampling rate to get a frequency in Hz.
+
+    The FFTW plans are shared by all the rows of a 2d ``data``.
+    """
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=real_dtype))
+    if data.ndim > 2:
+        raise ValueError('data must be a scalar, a 1d or a 2d array')
+    ntimes = data.shape[-1]
+    if data.size == 0:
+        raise ValueError('data must not be empty')
+    planner_code = _get_planner_code(planner)
+    try:
+        output_code = _HILBERT_OUTPUTS.index(output)
+    except ValueError as e:
+        raise ValueError(f'Unknown output: {output}') from e
+    nthreads = _get_nthreads(nthreads)
+    result = _get_output(
+        out, data.shape, dtype if output == 'complex' else real_dtype)
+
+    def _hilbert(group_data, group_result):
+        getattr(lib_st, f'hilbert_batch{suffix}')(
+            _get_workspace(), ntimes, len(group_data), output_code,
+            planner_code,
+            group_data.ctypes.data_as(POINTER(c_real)),
+            group_result.ctypes.data_as(POINTER(c_real)))
+
+    _map_channels(
+        _hilbert, data.reshape(-1, ntimes), result.reshape(-1, ntimes),
+        nthreads)
+    return result
+
+
+def dost_bands(n):
+    """
+    Return the frequency bands of the DOST of length ``n``.
+
+    Parameters
+    ----------
+    n : int
+        Length of the DOST.
+
+    Returns
+    -------
+    bands : list of (int, int)
+        Index of the first coefficient and number of coefficients of each
+        band, in the order of the coefficients returned by :func:`dost`.
+        See :func:`dost`.
+    """
+    if not isinstance(n, int) or n <= 0:
+        raise ValueError('n must be a positive integer')
+    kmax = (n - 1) // 2
+    positive = []
+    negative = []
+    start = 1
+    while start <= kmax:
+        width = min(start, kmax - start + 1)
+        positive.append((start, width))
+        negative.insert(0, (n - start - width + 1, width))
+        start *= 2
+    nyquist = [(n // 2, 1)] if n % 2 == 0 and n > 1 else []
+    return [(0, 1)] + positive + nyquist + negative
+
+
+def dost(data, planner='estimate', dtype=np.complex128):
+    """
+    Return the discrete orthonormal Stockwell transform of ``data``.
+
+    Parameters
+    ----------
+    data : array_like
+        Input data array, real.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Output data type (default numpy.complex128). See :func:`st`.
+
+    Returns
+    -------
+    result : ndarray
+        The n complex DOST coefficients of ``data``, where n is the length
+        of ``data``.
+
+    Notes
+    -----
+    The discrete orthonormal Stockwell transform (DOST) samples the
+    time-frequency plane with n coefficients, instead of the n/2 x n
+    coefficients of :func:`st`, and is computed in O(n log n) operations
+    (Stockwell, 2007; Wang and Orchard, 2009). The unitary FFT of ``data``
+    is split into octave bands (see :func:`dost_bands`): the frequency 0,
+    the positive frequencies from 2**(p-1) to 2**p - 1, for p = 1, 2, ...,
+    the Nyquist frequency (if n is even) and the corresponding negative
+    frequencies. Each band is replaced by its unitary inverse FFT.
+
+    The coefficients of a band of ``w`` frequencies, starting at index
+    ``a`` of the FFT, are stored at the indices ``a`` to ``a + w - 1`` of
+    the result: the coefficient ``a + j`` corresponds to the time index
+    ``j * n / w``. The transform is orthonormal: it preserves the energy of
+    ``data`` and it is inverted by :func:`idost`.
+    """
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=real_dtype))
+    if data.ndim != 1:
+        raise ValueError('data must be a scalar or a 1d array')
+    ntimes = len(data)
+    if ntimes == 0:
+        raise ValueError('data must not be empty')
+    planner_code = _get_planner_code(planner)
+    result = np.empty(ntimes, dtype=dtype)
+    getattr(lib_st, f'dost{suffix}')(
+        _get_workspace(), ntimes, planner_code,
+        data.ctypes.data_as(POINTER(c_real)),
+        result.ctypes.data_as(POINTER(c_real)))
+    return result
+
+
+def idost(data, planner='estimate', dtype=np.complex128):
+    """
+    Return the inverse discrete orthonormal Stockwell transform of ``data``.
+
+    Parameters
+    ----------
+    data : array_like
+        Input data array, complex, as returned by :func:`dost`.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See :func:`st`.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Precision of the computation (default numpy.complex128). The result
+        is float64 or float32, respectively.
 
     Returns
     -------
     result : ndarray
-        The Hilbert transform of ``data``.
+        The real signal whose DOST is ``data``.
     """
-    data = np.atleast_1d(np.ascontiguousarray(data, dtype=np.double))
+    real_dtype, suffix, c_real = _get_precision(dtype)
+    data = np.atleast_1d(np.ascontiguousarray(data, dtype=dtype))
     if data.ndim != 1:
         raise ValueError('data must be a scalar or a 1d array')
     ntimes = len(data)
     if ntimes == 0:
         raise ValueError('data must not be empty')
-    result = np.zeros(ntimes, dtype=np.complex128)
-    lib_st.hilbert(
-        ntimes,
-        data.ctypes.data_as(POINTER(c_double)),
-        result.ctypes.data_as(POINTER(c_double)))
+    planner_code = _get_planner_code(planner)
+    result = np.empty(ntimes, dtype=real_dtype)
+    getattr(lib_st, f'idost{suffix}')(
+        _get_workspace(), ntimes, planner_code,
+        data.ctypes.data_as(POINTER(c_real)),
+        result.ctypes.data_as(POINTER(c_real)))
     return result
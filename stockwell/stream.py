@@ -0,0 +1,179 @@
+# SPDX-License-Identifier: GPL-3.0-or-later
+"""
+stream.py.
+
+This file is part of the Stockwell project.
+
+:copyright:
+    2026 Claudio Satriano <satriano@ipgp.fr>
+
+:license:
+    GNU General Public License v3.0 or later.
+    (https://www.gnu.org/licenses/gpl-3.0.html)
+"""
+import numpy as np
+from .st import st
+
+
+class STStream:
+    """
+    Stockwell transform of a continuous data stream.
+
+    Samples are fed with :meth:`push` and the transform is returned in
+    blocks of time columns, as soon as they are complete. The memory used
+    is bounded by the segment length ``nperseg``, not by the length of the
+    stream.
+
+    Parameters
+    ----------
+    nperseg : int
+        Length of the segments on which the Stockwell transform is computed.
+        It sets the frequency sampling: frequency index ``n`` corresponds to
+        ``n / nperseg`` cycles per sample.
+    margin : int, optional
+        Number of samples discarded at each end of a segment (default
+        ``nperseg // 4``). See Notes.
+    lo : int, optional
+        Lowest frequency index to return (default 0).
+    hi : int, optional
+        Highest frequency index to return (default ``nperseg // 2``).
+    gamma : float, optional
+        Gamma parameter (default 1). See :func:`stockwell.st.st`.
+    win_type : {'gauss', 'kazemi'}, optional
+        Window type (default 'gauss'). See :func:`stockwell.st.st`.
+    tol : float, optional
+        Window truncation threshold (default 0). See
+        :func:`stockwell.st.st`.
+    planner : {'estimate', 'measure', 'patient'}, optional
+        FFTW planner effort (default 'estimate'). See
+        :func:`stockwell.st.st`.
+    dtype : {numpy.complex128, numpy.complex64}, optional
+        Output data type (default numpy.complex128). See
+        :func:`stockwell.st.st`.
+    output : {'complex', 'amplitude', 'power', 'db', 'phase'}, optional
+        Quantity to return for each time and frequency (default
+        'complex'). See :func:`stockwell.st.st`.
+
+    Notes
+    -----
+    The stream is cut into segments of ``nperseg`` samples, overlapping by
+    ``2 * margin`` samples. The Stockwell transform of each segment is
+    computed, and only its central ``nperseg - 2 * margin`` columns are
+    kept (overlap-save), so that each input sample gives exactly one
+    output column. The columns at the start and at the end of the stream
+    are computed by mirroring the data around its first and last sample.
+
+    The kept columns are exact, as long as the time window of each
+    frequency is shorter than ``margin``. For the Gaussian window, the
+    standard deviation of the time window of frequency index ``n`` is
+    ``gamma * nperseg / n`` samples, so that frequency indices larger than
+    about ``4 * gamma * nperseg / margin`` are not affected by the
+    segmentation. Frequencies whose window reaches the Nyquist frequency
+    are also slightly affected, since the spectrum of the analytic signal
+    is cut there. The FFTW plans are computed once, since all the segments
+    have the same length.
+    """
+
+    def __init__(self, nperseg, margin=None, lo=0, hi=None, gamma=1,
+                 win_type='gauss', tol=0, planner='estimate',
+                 dtype=np.complex128, output='complex'):
+        """Initialize the stream."""
+        if not isinstance(nperseg, int) or nperseg < 2:
+            raise ValueError('nperseg must be an integer larger than 1')
+        if margin is None:
+            margin = nperseg // 4
+        if not isinstance(margin, int) or not 0 <= 2 * margin < nperseg:
+            raise ValueError(
+                'margin must be an integer between 0 and (nperseg - 1) / 2')
+        if hi is None:
+            hi = nperseg // 2
+        self.nperseg = nperseg
+        self.margin = margin
+        self._kwargs = {
+            'lo': lo, 'hi': hi, 'gamma': gamma, 'win_type': win_type,
+            'tol': tol, 'planner': planner, 'dtype': dtype, 'output': output
+        }
+        # Check the parameters and allocate the transform of a segment,
+        # which is reused for all the segments
+        self._result = st(np.zeros(nperseg), **self._kwargs)
+        self._buffer = np.zeros(0)
+        self._started = False
+
+    @property
+    def hop(self):
+        """Number of new columns computed for each segment."""
+        return self.nperseg - 2 * self.margin
+
+    def push(self, samples):
+        """
+        Add samples to the stream and return the completed columns.
+
+        Parameters
+        ----------
+        samples : array_like
+            New samples of the stream.
+
+        Returns
+        -------
+        blocks : list of ndarray
+            Blocks of completed columns of the Stockwell transform, in time
+            order (possibly an empty list). The first dimension of each
+            block is the frequency axis, the second dimension is the time
+            axis.
+        """
+        samples = np.atleast_1d(np.asarray(samples, dtype=np.double))
+        if samples.ndim != 1:
+            raise ValueError('samples must be a scalar or a 1d array')
+        self._buffer = np.concatenate((self._buffer, samples))
+        if not self._started:
+            # Wait for the first segment, then mirror the data before the
+            # first sample
+            if len(self._buffer) < self.nperseg - self.margin:
+                return []
+            self._buffer = np.pad(
+                self._buffer, (self.margin, 0), mode='reflect')
+            self._started = True
+        blocks = []
+        while len(self._buffer) >= self.nperseg:
+            blocks.append(self._transform(self.hop))
+        return blocks
+
+    def flush(self):
+        """
+        Return the remaining columns and reset the stream.
+
+        The data are mirrored around the last sample of the stream. After
+        this call, the stream can be used again for new data.
+
+        Returns
+        -------
+        blocks : list of ndarray
+            Blocks of the remaining columns of the Stockwell transform (see
+            :meth:`push`).
+        """
+        buffer = self._buffer
+        if not self._started and len(buffer) > 0:
+            buffer = np.pad(buffer, (self.margin, 0), mode='reflect')
+        ncols = len(buffer) - self.margin if len(buffer) else 0
+        blocks = []
+        if ncols > 0:
+            # Mirror the data after the last sample, and complete the last
+            # segment with zeros, which are farther than margin from the
+            # returned columns
+            buffer = np.pad(buffer, (0, self.margin), mode='reflect')
+            nseg = -(-ncols // self.hop)
+            npad = (nseg - 1) * self.hop + self.nperseg - len(buffer)
+            self._buffer = np.pad(buffer, (0, npad))
+            while ncols > 0:
+                blocks.append(self._transform(min(ncols, self.hop)))
+                ncols -= self.hop
+        self._buffer = np.zeros(0)
+        self._started = False
+        return blocks
+
+    def _transform(self, ncols):
+        """Transform the first segment of the buffer and advance it."""
+        st(self._buffer[:self.nperseg], out=self._result, **self._kwargs)
+        block = self._result[:, self.margin:self.margin + ncols].copy()
+        self._buffer = self._buffer[self.hop:]
+        return block
@@ -12,7 +12,9 @@ This file is part of the Stockwell project.
     (https://www.gnu.org/licenses/gpl-3.0.html)
 """
 import os
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from numpy.testing import assert_allclose
 from stockwell.lib_path import get_lib_path
@@ -57,15 +59,27 @@ class TestStockwellTransform(unittest.TestCase):
 
     def test_st_input_validation(self):
         """Test st raises on invalid inputs."""
-        # 2D input
+        # 3D input
         with self.assertRaises(ValueError):
-            self.st.st(np.ones((4, 4)))
+            self.st.st(np.ones((2, 4, 4)))
         # non-integer lo
         with self.assertRaises(ValueError):
             self.st.st(np.arange(8), lo=1.5)
         # non-integer hi
         with self.assertRaises(ValueError):
             self.st.st(np.arange(8), hi=3.7)
+        # lo and hi out of range
+        data = np.random.rand(100)
+        with self.assertRaises(ValueError):
+            self.st.st(data, 0, 99)
+        with self.assertRaises(ValueError):
+            self.st.st(data, -20, 10)
+        with self.assertRaises(ValueError):
+            self.st.st(data, 30, 20)
+        with self.assertRaises(ValueError):
+            self.st.st(data, 0, 99, output='amplitude', nthreads=2)
+        # a single row at zero frequency
+        assert_allclose(self.st.st(data, 0, 0), self.st.st(data)[:1])
         # invalid win_type
         with self.assertRaises(ValueError):
             self.st.st(np.arange(8), win_type='invalid')
@@ -163,6 +177,545 @@ class TestStockwellTransform(unittest.TestCase):
         corr = np.corrcoef(recovered, w)[0, 1]
         self.assertGreater(corr, 0.99)
 
+    def test_st_tol(self):
+        """Test that truncating the window barely changes the result."""
+        data = np.random.randn(500)
+        # sourcery skip: no-loop-in-tests
+        for win_type in 'gauss', 'kazemi':
+            with self.subTest(win_type=win_type):
+                stock = self.st.st(data, win_type=win_type)
+                stock_tol = self.st.st(data, win_type=win_type, tol=1e-12)
+                assert_allclose(
+                    stock_tol, stock, atol=1e-10 * np.abs(stock).max())
+        # a larger tolerance is visible, but stays small
+        stock = self.st.st(data)
+        stock_tol = self.st.st(data, 10, 50, tol=1e-3)
+        self.assertLess(
+            np.abs(stock_tol - stock[10:51]).max(),
+            1e-2 * np.abs(stock).max())
+        with self.assertRaises(ValueError):
+            self.st.st(data, tol=1)
+
+    def test_st_decimated(self):
+        """Test that decimated rows are samples of the full transform."""
+        n = 512
+        data = np.random.randn(n)
+        stock = self.st.st(data, tol=1e-8)
+        rows, steps = self.st.st_decimated(data, tol=1e-8)
+        self.assertEqual(len(rows), n // 2 + 1)
+        # sourcery skip: no-loop-in-tests
+        for freq, (row, step) in enumerate(zip(rows, steps)):
+            with self.subTest(freq=freq):
+                self.assertEqual(len(row) * step, n)
+                assert_allclose(row, stock[freq, ::int(step)], atol=1e-12)
+        # low frequencies need fewer samples
+        self.assertLess(len(rows[10]), len(rows[200]))
+        stock_common, step = self.st.st_decimated(
+            data, 0, 40, tol=1e-8, grid='common', ntimes=128)
+        self.assertEqual(step, 4)
+        assert_allclose(stock_common, stock[:41, ::4], atol=1e-12)
+        with self.assertRaises(ValueError):
+            self.st.st_decimated(data, 0, 40, grid='common', ntimes=8)
+        with self.assertRaises(ValueError):
+            self.st.st_decimated(data, 0, n)
+
+    def test_st_freqs(self):
+        """Test st with an arbitrary set of frequencies."""
+        n = 400
+        data = np.random.randn(n)
+        stock = self.st.st(data)
+        rows = [50, 3, 0, 17, 200]
+        assert_allclose(self.st.st(data, freqs=rows), stock[rows])
+        # log-spaced frequencies in Hz
+        srate = 100.
+        freqs = np.logspace(-1, np.log10(20), 10)
+        rows = np.round(freqs * n / srate).astype(int)
+        stock_hz = self.st.st(data, freqs=freqs, srate=srate)
+        assert_allclose(stock_hz, stock[rows])
+        with self.assertRaises(ValueError):
+            self.st.st(data, freqs=[1.5, 2.5])
+        with self.assertRaises(ValueError):
+            self.st.st(data, freqs=[60.], srate=srate)
+        with self.assertRaises(ValueError):
+            self.st.st(data, lo=2, freqs=[3])
+
+    def test_st_single_precision(self):
+        """Test the single precision (complex64) transforms."""
+        n = 300
+        data = np.random.randn(n)
+        stock = self.st.st(data)
+        stock32 = self.st.st(data, dtype=np.complex64)
+        self.assertEqual(stock32.dtype, np.complex64)
+        scale = np.abs(stock).max()
+        assert_allclose(stock32, stock, atol=1e-5 * scale)
+        stock32 = self.st.st(data, 5, 80, tol=1e-6, dtype=np.complex64)
+        assert_allclose(stock32, stock[5:81], atol=1e-5 * scale)
+        stock32 = self.st.st(data, freqs=[40, 2], dtype=np.complex64)
+        assert_allclose(stock32, stock[[40, 2]], atol=1e-5 * scale)
+        rows, _ = self.st.st_decimated(data, dtype=np.complex64)
+        self.assertEqual(rows[10].dtype, np.complex64)
+        inv = self.st.ist(stock32, freqs=[40, 2], dtype=np.complex64)
+        self.assertEqual(inv.dtype, np.float32)
+        inv = self.st.ist(self.st.st(data, dtype=np.complex64),
+                          dtype=np.complex64)
+        assert_allclose(inv, data, atol=1e-5)
+        with self.assertRaises(ValueError):
+            self.st.st(data, dtype=np.float64)
+        with self.assertRaises(ValueError):
+            self.st.ist(stock, dtype='foo')
+
+    def test_st_out(self):
+        """Test st, ist and hilbert with preallocated output arrays."""
+        n = 128
+        data = np.random.randn(n)
+        stock = self.st.st(data)
+        out = np.full((n // 2 + 1, n), np.nan, dtype=np.complex128)
+        res = self.st.st(data, out=out)
+        self.assertIs(res, out)
+        assert_allclose(out, stock)
+        out = np.empty((3, n), dtype=np.complex64)
+        self.st.st(data, freqs=[1, 5, 9], dtype=np.complex64, out=out)
+        assert_allclose(out, stock[[1, 5, 9]], atol=1e-5)
+        out = np.empty(n)
+        self.assertIs(self.st.ist(stock, out=out), out)
+        assert_allclose(out, data)
+        out = np.empty(n, dtype=np.complex128)
+        self.assertIs(self.st.hilbert(data, out=out), out)
+        assert_allclose(out, self.st.hilbert(data))
+        # wrong shape, dtype, or non contiguous array
+        with self.assertRaises(ValueError):
+            self.st.st(data, 0, 10, out=np.empty((10, n), dtype=complex))
+        with self.assertRaises(ValueError):
+            self.st.st(data, 0, 10, out=np.empty((11, n), dtype=np.complex64))
+        with self.assertRaises(ValueError):
+            self.st.st(
+                data, 0, 10, out=np.empty((11, 2 * n), dtype=complex)[:, ::2])
+        with self.assertRaises(ValueError):
+            self.st.ist(stock, out=np.empty(n, dtype=complex))
+        with self.assertRaises(ValueError):
+            self.st.hilbert(data, out=[0] * n)
+
+    def test_st_output(self):
+        """Test the amplitude, power, dB and phase outputs of st."""
+        n = 200
+        data = np.random.randn(n) + 1
+        stock = self.st.st(data)
+        expected = {
+            'amplitude': np.abs(stock),
+            'power': np.abs(stock)**2,
+            'db': 10 * np.log10(np.abs(stock)**2),
+            'phase': np.angle(stock),
+        }
+        # sourcery skip: no-loop-in-tests
+        for output, exp in expected.items():
+            with self.subTest(output=output):
+                res = self.st.st(data, output=output)
+                self.assertEqual(res.dtype, np.float64)
+                assert_allclose(res, exp, atol=1e-10)
+                res = self.st.st(data, freqs=[7, 0], output=output)
+                assert_allclose(res, exp[[7, 0]], atol=1e-10)
+                res = self.st.st(
+                    data, output=output, dtype=np.complex64,
+                    out=np.empty((n // 2 + 1, n), dtype=np.float32))
+                self.assertEqual(res.dtype, np.float32)
+                rows, _ = self.st.st_decimated(data, 0, 40, output=output)
+                rows_c, _ = self.st.st_decimated(data, 0, 40)
+                func = {
+                    'amplitude': np.abs,
+                    'power': lambda x: np.abs(x)**2,
+                    'db': lambda x: 10 * np.log10(np.abs(x)**2),
+                    'phase': np.angle,
+                }[output]
+                assert_allclose(rows[20], func(rows_c[20]), atol=1e-10)
+        with self.assertRaises(ValueError):
+            self.st.st(data, output='abs')
+        with self.assertRaises(ValueError):
+            self.st.st(data, output='power',
+                       out=np.empty((n // 2 + 1, n), dtype=complex))
+
+    def test_st_memmap(self):
+        """Test st_memmap, computing the transform in blocks of rows."""
+        n = 300
+        data = np.random.randn(n)
+        stock = self.st.st(data)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'stock.npy')
+            res = self.st.st_memmap(filename, data, block_size=7)
+            self.assertIsInstance(res, np.memmap)
+            assert_allclose(res, stock)
+            del res
+            assert_allclose(np.load(filename, mmap_mode='r'), stock)
+            res = self.st.st_memmap(
+                filename, data, freqs=[9, 3, 100], output='power',
+                block_size=2)
+            assert_allclose(res, np.abs(stock[[9, 3, 100]])**2)
+            del res
+            res = self.st.st_memmap(filename, data, 10, 20)
+            assert_allclose(res, stock[10:21])
+            del res
+            with self.assertRaises(ValueError):
+                self.st.st_memmap(filename, data, block_size=0)
+            with self.assertRaises(ValueError):
+                self.st.st_memmap(filename, data, 0, n)
+
+    def test_st_channels(self):
+        """Test st with a 2d array of channels, using several threads."""
+        rng = np.random.default_rng(7)
+        data = rng.standard_normal((5, 100))
+        expected = np.array([self.st.st(channel) for channel in data])
+        res = self.st.st(data)
+        self.assertEqual(res.shape, (5, 51, 100))
+        assert_allclose(res, expected)
+        res = self.st.st(data, nthreads=3)
+        self.assertTrue(res.flags.c_contiguous)
+        assert_allclose(res, expected)
+        out = np.empty((5, 3, 100))
+        self.st.st(data, freqs=[4, 1, 9], output='amplitude', nthreads=None,
+                   out=out)
+        assert_allclose(out, np.abs(expected[:, [4, 1, 9]]))
+        with self.assertRaises(ValueError):
+            self.st.st(data, nthreads=0)
+        with self.assertRaises(ValueError):
+            self.st.st(np.ones((3, 0)))
+
+    def test_st_reduce(self):
+        """Test the fused reductions of the Stockwell transform."""
+        rng = np.random.default_rng(13)
+        n = 256
+        data = rng.standard_normal(n)
+        amp = np.abs(self.st.st(data, 5, 100))
+        spectrum = self.st.st_reduce(data, 'spectrum', 5, 100)
+        assert_allclose(spectrum, amp.mean(axis=1))
+        bands = [(5, 20), (10, 100), (50, 50)]
+        peak, energy = self.st.st_reduce(
+            data, ['peak', 'bands'], 5, 100, bands=bands)
+        assert_allclose(peak, 5 + amp.argmax(axis=0))
+        expected = [(amp[b0 - 5:b1 - 4]**2).sum(axis=0) for b0, b1 in bands]
+        assert_allclose(energy, expected)
+        spectrum = self.st.st_reduce(
+            data, 'spectrum', 5, 100, dtype=np.complex64)
+        self.assertEqual(spectrum.dtype, np.float32)
+        assert_allclose(spectrum, amp.mean(axis=1), rtol=1e-4)
+        with self.assertRaises(ValueError):
+            self.st.st_reduce(data, 'mean')
+        with self.assertRaises(ValueError):
+            self.st.st_reduce(data, 'bands')
+        with self.assertRaises(ValueError):
+            self.st.st_reduce(data, 'bands', 5, 100, bands=[(1, 10)])
+
+    def test_st_multitaper(self):
+        """Test the multitaper Stockwell power."""
+        from stockwell.sine import sine_taper
+        rng = np.random.default_rng(17)
+        n = 200
+        data = rng.standard_normal(n)
+        expected = np.mean([
+            np.abs(self.st.st(data * sine_taper(k, n), 0, 60, tol=1e-6))**2
+            for k in range(4)
+        ], axis=0)
+        power = self.st.st_multitaper(data, 4, 0, 60, tol=1e-6)
+        assert_allclose(power, expected, atol=1e-12)
+        power = self.st.st_multitaper(data, 4, 0, 60, dtype=np.complex64)
+        self.assertEqual(power.dtype, np.float32)
+        assert_allclose(power, expected, rtol=1e-3, atol=1e-6)
+        with self.assertRaises(ValueError):
+            self.st.st_multitaper(data, 0)
+
+    def test_st_pad(self):
+        """Test padding to a fast FFT length."""
+        t = np.arange(1009)
+        data = np.cos(2 * np.pi * 100 / 1009 * t)
+        expected = self.st.st(data, 20, 300)
+        stran = self.st.st(data, 20, 300, pad='fast')
+        self.assertEqual(stran.shape, expected.shape)
+        # padding to 1024 moves the frequencies by less than half a row
+        assert_allclose(
+            np.abs(stran[30:200, 100:700]), np.abs(expected[30:200, 100:700]),
+            atol=0.02)
+        stran = self.st.st(
+            data, freqs=[98.5, 100], srate=1009, pad='fast',
+            pad_mode='reflect')
+        assert_allclose(np.abs(stran[1, 100:700]), 1, atol=0.01)
+        # a 7-smooth length is not padded
+        data = np.random.randn(2 * 3 * 5 * 7)
+        assert_allclose(self.st.st(data, pad='fast'), self.st.st(data))
+        with self.assertRaises(ValueError):
+            self.st.st(data, pad='next')
+        with self.assertRaises(ValueError):
+            self.st.st(data, pad='fast', pad_mode='edge')
+
+    def test_st_threads(self):
+        """Test that concurrent st calls from several threads are safe."""
+        rng = np.random.default_rng(42)
+        # use different lengths, so that each thread needs its own plans
+        signals = [rng.standard_normal(n) for n in (64, 100, 128, 255) * 4]
+        expected = [self.st.st(sig) for sig in signals]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(self.st.st, signals))
+        # sourcery skip: no-loop-in-tests
+        for res, exp in zip(results, expected):
+            assert_allclose(res, exp)
+
+    def test_st_threads_pool_resize(self):
+        """Test concurrent calls which grow the thread pool."""
+        rng = np.random.default_rng(7)
+        data = rng.standard_normal((6, 64))
+        expected = self.st.st(data)
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(
+                lambda nthreads: self.st.st(data, nthreads=nthreads),
+                [2, 3, 4, 5, 6, 2, 3, 4, 5, 6]))
+        # sourcery skip: no-loop-in-tests
+        for res in results:
+            assert_allclose(res, expected)
+
+
+class TestSTStream(unittest.TestCase):
+    """Test the streaming Stockwell transform."""
+
+    def setUp(self):
+        """Import the stream module lazily."""
+        from stockwell import st, stream
+        self.st = st
+        self.stream = stream
+
+    def _run(self, stream, data, chunk_lens):
+        """Push data in chunks of the given lengths and flush the stream."""
+        blocks = []
+        start = 0
+        # sourcery skip: no-loop-in-tests
+        for length in chunk_lens:
+            blocks += stream.push(data[start:start + length])
+            start += length
+        blocks += stream.push(data[start:])
+        blocks += stream.flush()
+        return np.hstack(blocks)
+
+    def test_stream_basic(self):
+        """Test that the stream matches the full Stockwell transform."""
+        rng = np.random.default_rng(1)
+        nperseg = 256
+        data = rng.standard_normal(4 * nperseg)
+        stream = self.stream.STStream(nperseg, margin=64, lo=16, hi=80)
+        res = self._run(stream, data, [10, 300, 1, 500])
+        self.assertEqual(res.shape, (65, len(data)))
+        # the stream can be reused, with a different chunking
+        res2 = self._run(stream, data, [256] * 4)
+        assert_allclose(res2, res)
+        # rows of the full transform at the same frequencies (in cycles
+        # per sample), away from the edges of the record
+        stock = self.st.st(data, freqs=np.arange(16, 81) * 4)
+        scale = np.abs(stock).max()
+        assert_allclose(
+            res[:, 200:-200], stock[:, 200:-200], atol=1e-4 * scale)
+        # short stream, shorter than a segment
+        res = self._run(stream, data[:50], [])
+        self.assertEqual(res.shape, (65, 50))
+        with self.assertRaises(ValueError):
+            self.stream.STStream(64, hi=100)
+        stream = self.stream.STStream(64, lo=0, hi=0)
+        res = self._run(stream, data, [256] * 4)
+        self.assertEqual(res.shape, (1, len(data)))
+
+    def test_stream_output(self):
+        """Test the stream with real outputs and invalid parameters."""
+        data = np.random.randn(300)
+        stream = self.stream.STStream(64, output='amplitude')
+        blocks = stream.push(data)
+        self.assertTrue(all(block.dtype == np.float64 for block in blocks))
+        self.assertEqual(sum(block.shape[1] for block in blocks), 256)
+        with self.assertRaises(ValueError):
+            self.stream.STStream(64, margin=32)
+        with self.assertRaises(ValueError):
+            self.stream.STStream(64, output='foo')
+
+
+class TestPlanCache(unittest.TestCase):
+    """Test the FFTW plan cache."""
+
+    def setUp(self):
+        """Import the st module lazily."""
+        from stockwell import st  # pylint: disable=import-outside-toplevel
+        self.st = st
+        info = st.plan_cache_info()
+        self.size = info['size']
+        self.window_size = info['window_cache_size']
+        st.clear_plan_cache()
+
+    def tearDown(self):
+        """Restore the default cache sizes."""
+        self.st.set_plan_cache_size(self.size)
+        self.st.set_window_cache_size(self.window_size)
+
+    def test_plan_cache_lru(self):
+        """Test that plans are cached by length and evicted LRU first."""
+        self.st.set_plan_cache_size(4)
+        self.st.st(np.arange(16))
+        self.st.st(np.arange(10))
+        plans = self.st.plan_cache_info()['plans']
+        self.assertEqual(
+            plans,
+            [(10, 'backward', 'double'), (10, 'r2c', 'double'),
+             (16, 'backward', 'double'), (16, 'r2c', 'double')]
+        )
+        # ist only needs the backward plan, and 16 becomes the most recent
+        self.st.ist(self.st.st(np.arange(16)))
+        self.st.hilbert(np.arange(8))
+        plans = self.st.plan_cache_info()['plans']
+        self.assertEqual(
+            plans,
+            [(8, 'backward', 'double'), (8, 'r2c', 'double'),
+             (16, 'backward', 'double'), (16, 'r2c', 'double')]
+        )
+        # single precision plans are cached separately
+        self.st.hilbert(np.arange(8), dtype=np.complex64)
+        plans = self.st.plan_cache_info()['plans']
+        self.assertEqual(
+            plans[:2], [(8, 'backward', 'single'), (8, 'r2c', 'single')])
+
+    def test_plan_cache_results(self):
+        """Test that cached and uncached plans give the same results."""
+        data = np.random.randn(100)
+        expected = self.st.st(data)
+        self.st.set_plan_cache_size(0)
+        assert_allclose(self.st.st(data), expected)
+        self.assertEqual(self.st.plan_cache_info()['plans'], [])
+
+    def test_plan_cache_clear(self):
+        """Test clearing the plan cache."""
+        self.st.hilbert(np.arange(8))
+        self.assertEqual(len(self.st.plan_cache_info()['plans']), 2)
+        self.st.clear_plan_cache()
+        self.assertEqual(self.st.plan_cache_info()['plans'], [])
+        with self.assertRaises(ValueError):
+            self.st.set_plan_cache_size(-1)
+
+    def test_window_cache(self):
+        """Test that cached windows give the same results within the cap."""
+        data = np.random.randn(256)
+        self.st.set_window_cache_size(0)
+        expected = self.st.st(data)
+        expected_tol = self.st.st(data, tol=1e-6)
+        self.assertEqual(self.st.plan_cache_info()['window_cache_bytes'], 0)
+        self.st.set_window_cache_size(100000)
+        # sourcery skip: no-loop-in-tests
+        for _ in range(2):
+            assert_allclose(self.st.st(data), expected)
+            assert_allclose(self.st.st(data, tol=1e-6), expected_tol)
+            nbytes = self.st.plan_cache_info()['window_cache_bytes']
+            self.assertGreater(nbytes, 0)
+            self.assertLessEqual(nbytes, 100000)
+        self.st.clear_plan_cache()
+        self.assertEqual(self.st.plan_cache_info()['window_cache_bytes'], 0)
+        with self.assertRaises(ValueError):
+            self.st.set_window_cache_size(-1)
+
+    def test_window_cache_threads(self):
+        """Test that the cap is shared by the threads, and the cache freed."""
+        data = np.random.randn(8, 1024)
+        expected = self.st.st(data, nthreads=1)
+        self.st.clear_plan_cache()
+        self.st.set_window_cache_size(300000)
+        assert_allclose(self.st.st(data, nthreads=4), expected)
+        total = self.st.plan_cache_info()['window_cache_total']
+        self.assertGreater(total, 0)
+        self.assertLessEqual(total, 300000)
+        self.st.clear_plan_cache()
+        self.assertEqual(self.st.plan_cache_info()['window_cache_total'], 0)
+
+
+class TestStats(unittest.TestCase):
+    """Test the instrumentation counters."""
+
+    def setUp(self):
+        """Import the st module lazily."""
+        from stockwell import st  # pylint: disable=import-outside-toplevel
+        self.st = st
+        st.clear_plan_cache()
+        st.reset_stats()
+
+    def tearDown(self):
+        """Disable timing."""
+        self.st.set_stats_timing(False)
+
+    def test_stats(self):
+        """Test the counters of st, ist and hilbert."""
+        data = np.random.randn(64)
+        self.st.st(data, 1, 10)
+        stats = self.st.stats()
+        self.assertEqual(stats['plan_builds'], 2)
+        self.assertEqual(stats['fft_executions'], 11)
+        self.assertEqual(stats['window_evals'], 10)
+        self.assertEqual(stats['bytes_written'], 10 * 64 * 16)
+        self.assertEqual(stats['fft_time'], 0)
+        self.assertFalse(stats['timing'])
+        self.st.set_stats_timing(True)
+        self.st.ist(self.st.st(data, 1, 10), 1, 10)
+        self.st.hilbert(data)
+        stats = self.st.stats()
+        self.assertEqual(stats['plan_builds'], 2)
+        self.assertEqual(stats['window_hits'], 10)
+        self.assertGreater(stats['plan_hits'], 0)
+        self.assertGreater(stats['fft_time'], 0)
+        self.assertTrue(stats['timing'])
+        self.st.reset_stats()
+        self.assertEqual(self.st.stats()['fft_executions'], 0)
+
+    def test_stats_threads(self):
+        """Test that the counters of the thread pool are merged."""
+        data = np.random.randn(4, 64)
+        self.st.st(data, nthreads=1)
+        expected = self.st.stats()['fft_executions']
+        self.st.reset_stats()
+        self.st.st(data, nthreads=2)
+        self.assertEqual(self.st.stats()['fft_executions'], expected)
+
+
+class TestPlanner(unittest.TestCase):
+    """Test the FFTW planner effort and wisdom file."""
+
+    def setUp(self):
+        """Import the st module lazily and use a temporary wisdom file."""
+        from stockwell import st  # pylint: disable=import-outside-toplevel
+        self.st = st
+        self.wisdom_file = st.get_wisdom_file()
+        # pylint: disable=consider-using-with
+        self.tmpdir = tempfile.TemporaryDirectory()
+        st.set_wisdom_file(os.path.join(self.tmpdir.name, 'wisdom'))
+        st.clear_plan_cache()
+
+    def tearDown(self):
+        """Restore the wisdom file."""
+        self.st.set_wisdom_file(self.wisdom_file)
+        self.tmpdir.cleanup()
+
+    def test_planner_measure(self):
+        """Test that measured plans give the same results and save wisdom."""
+        data = np.random.randn(60)
+        expected = self.st.st(data)
+        assert_allclose(self.st.st(data, planner='measure'), expected)
+        assert_allclose(
+            self.st.ist(expected, planner='patient'), data, atol=1e-12)
+        assert_allclose(
+            self.st.hilbert(data, planner='measure'),
+            self.st.hilbert(data)
+        )
+        self.assertTrue(os.path.exists(self.st.get_wisdom_file()))
+
+    def test_planner_no_wisdom(self):
+        """Test disabling the wisdom file."""
+        self.st.set_wisdom_file(None)
+        self.assertIsNone(self.st.get_wisdom_file())
+        self.st.st(np.arange(10), planner='measure')
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_planner_invalid(self):
+        """Test that an unknown planner raises."""
+        with self.assertRaises(ValueError):
+            self.st.st(np.arange(8), planner='invalid')
+        with self.assertRaises(ValueError):
+            self.st.hilbert(np.arange(8), planner='fast')
+
 
 class TestInverseStockwell(unittest.TestCase):
     """Test the inverse Stockwell transform (ist)."""
@@ -182,6 +735,93 @@ class TestInverseStockwell(unittest.TestCase):
         array = self.st.ist(stock)
         assert_allclose(array, array_expected)
 
+    def test_ist_direct(self):
+        """Test ist against a direct computation of the inverse."""
+        rng = np.random.default_rng(3)
+        # sourcery skip: no-loop-in-tests
+        for n in (63, 64):
+            with self.subTest(n=n):
+                shape = (n // 2 + 1, n)
+                stock = rng.standard_normal(shape).astype(complex)
+                stock.imag = rng.standard_normal(shape)
+                freqs = np.arange(n // 2 + 1)
+                times = np.arange(n)
+                spec = np.zeros(n, dtype=complex)
+                spec[freqs] = np.sum(
+                    stock * np.exp(-2j * np.pi * np.outer(freqs, times) / n),
+                    axis=1)
+                spec[1:(n + 1) // 2] /= 2
+                spec[n // 2 + 1:] = np.conj(spec[1:(n + 1) // 2][::-1])
+                expected = np.fft.ifft(spec).real
+                assert_allclose(self.st.ist(stock), expected, atol=1e-12)
+
+    def test_ist_batch(self):
+        """Test ist with a 3d batch of arrays, using several threads."""
+        rng = np.random.default_rng(5)
+        data = rng.standard_normal((7, 64))
+        stock = self.st.st(data)
+        expected = np.array([self.st.ist(s) for s in stock])
+        assert_allclose(expected, data)
+        res = self.st.ist(stock)
+        self.assertEqual(res.shape, (7, 64))
+        assert_allclose(res, expected)
+        assert_allclose(self.st.ist(stock, nthreads=3), expected)
+        res = self.st.ist(stock[:, 2:10], lo=2, hi=9, nthreads=2)
+        expected = np.array([self.st.ist(s[2:10], lo=2, hi=9) for s in stock])
+        assert_allclose(res, expected)
+        res = self.st.ist(stock[:, [3, 1]], freqs=[3, 1], nthreads=None)
+        expected = np.array([self.st.ist(s[[3, 1]], freqs=[3, 1])
+                             for s in stock])
+        assert_allclose(res, expected)
+
+    def test_st_filter(self):
+        """Test the fused time-frequency filter."""
+        rng = np.random.default_rng(11)
+        n = 200
+        data = rng.standard_normal(n)
+        mask = (rng.random((71, n)) > 0.5).astype(float)
+        stock = self.st.st(data, 10, 80)
+        expected = self.st.ist(stock * mask, 10, 80)
+        res = self.st.st_filter(data, mask, 10, 80)
+        assert_allclose(res, expected, atol=1e-12)
+        # callback: keep only the samples above the row median
+        stock = self.st.st(data)
+        amp = np.abs(stock)
+        expected = self.st.ist(
+            np.where(amp > np.median(amp, axis=1)[:, None], stock, 0))
+        res = self.st.st_filter(
+            data, lambda row, freq: np.where(
+                np.abs(row) > np.median(np.abs(row)), row, 0))
+        assert_allclose(res, expected, atol=1e-12)
+        res = self.st.st_filter(data, np.ones((101, n)), dtype=np.complex64)
+        self.assertEqual(res.dtype, np.float32)
+        assert_allclose(res, data, atol=1e-5)
+
+        def fail(row, freq):
+            raise RuntimeError(f'error at {freq}')
+
+        with self.assertRaises(RuntimeError):
+            self.st.st_filter(data, fail)
+        with self.assertRaises(ValueError):
+            self.st.st_filter(data, mask)
+
+    def test_ist_freqs(self):
+        """Test ist with an arbitrary set of frequencies."""
+        n = 128
+        data = np.random.randn(n)
+        stock = self.st.st(data)
+        rows = np.arange(n // 2 + 1)[::-1]
+        recovered = self.st.ist(stock[rows], freqs=rows)
+        assert_allclose(recovered, data, atol=1e-12)
+        # a subset of the frequencies gives the same result as lo, hi
+        rows = np.arange(10, 30)
+        assert_allclose(
+            self.st.ist(stock[rows], freqs=rows),
+            self.st.ist(stock[10:30], 10, 29)
+        )
+        with self.assertRaises(ValueError):
+            self.st.ist(stock, freqs=rows)
+
     def test_ist_input_validation(self):
         """Test ist raises on invalid inputs."""
         # 1D input
@@ -196,11 +836,60 @@ class TestInverseStockwell(unittest.TestCase):
         # dimension mismatch
         with self.assertRaises(ValueError):
             self.st.ist(np.ones((4, 8)), lo=0, hi=10)
+        # frequencies above the Nyquist frequency
+        with self.assertRaises(ValueError):
+            self.st.ist(np.ones((4, 8)), lo=2, hi=5)
+        # 4D input
+        with self.assertRaises(ValueError):
+            self.st.ist(np.ones((2, 2, 4, 8)))
         # empty array
         with self.assertRaises(ValueError):
             self.st.ist(np.ones((4, 0), dtype=complex))
 
 
+class TestDOST(unittest.TestCase):
+    """Test the discrete orthonormal Stockwell transform."""
+
+    def setUp(self):
+        """Import the st module lazily."""
+        from stockwell import st  # pylint: disable=import-outside-toplevel
+        self.st = st
+
+    def test_dost_basic(self):
+        """Test dost against a direct computation with numpy."""
+        rng = np.random.default_rng(17)
+        # sourcery skip: no-loop-in-tests
+        for n in (1, 2, 9, 64, 100):
+            with self.subTest(n=n):
+                data = rng.standard_normal(n)
+                bands = self.st.dost_bands(n)
+                self.assertEqual(sum(width for _, width in bands), n)
+                expected = np.fft.fft(data, norm='ortho')
+                for start, width in bands:
+                    band = slice(start, start + width)
+                    expected[band] = np.fft.ifft(expected[band], norm='ortho')
+                coeffs = self.st.dost(data)
+                assert_allclose(coeffs, expected, atol=1e-12)
+                # orthonormality and inverse
+                assert_allclose(
+                    np.linalg.norm(coeffs), np.linalg.norm(data))
+                assert_allclose(self.st.idost(coeffs), data, atol=1e-12)
+
+    def test_dost_single_precision(self):
+        """Test dost and idost in single precision."""
+        data = np.random.randn(128)
+        coeffs = self.st.dost(data, dtype=np.complex64)
+        self.assertEqual(coeffs.dtype, np.complex64)
+        assert_allclose(coeffs, self.st.dost(data), atol=1e-5)
+        res = self.st.idost(coeffs, dtype=np.complex64)
+        self.assertEqual(res.dtype, np.float32)
+        assert_allclose(res, data, atol=1e-5)
+        with self.assertRaises(ValueError):
+            self.st.dost(np.ones((2, 2)))
+        with self.assertRaises(ValueError):
+            self.st.dost_bands(0)
+
+
 class TestHilbert(unittest.TestCase):
     """Test the Hilbert transform."""
 
@@ -220,13 +909,45 @@ class TestHilbert(unittest.TestCase):
         ])
         hilbert = self.st.hilbert(array)
         assert_allclose(hilbert, hilbert_expected)
+        hilbert = self.st.hilbert(array, dtype=np.complex64)
+        self.assertEqual(hilbert.dtype, np.complex64)
+        assert_allclose(hilbert, hilbert_expected, rtol=1e-5)
+
+    def test_hilbert_batch(self):
+        """Test the batched Hilbert transform and its output formats."""
+        rng = np.random.default_rng(21)
+        t = np.arange(300)
+        data = np.cos(2 * np.pi * (0.02 + 0.0005 * t) * t)
+        data = data * (1 + 0.5 * rng.random((5, 1)))
+        analytic = self.st.hilbert(data, nthreads=2)
+        self.assertEqual(analytic.shape, data.shape)
+        # sourcery skip: no-loop-in-tests
+        for row, res in zip(data, analytic):
+            assert_allclose(res, self.st.hilbert(row))
+        phase = np.unwrap(np.angle(analytic))
+        expected = {
+            'envelope': np.abs(analytic),
+            'phase': phase,
+            'inst_freq': np.gradient(phase, axis=-1) / (2 * np.pi),
+        }
+        for output, exp in expected.items():
+            with self.subTest(output=output):
+                res = self.st.hilbert(data, output=output)
+                self.assertEqual(res.dtype, np.float64)
+                assert_allclose(res, exp, atol=1e-10)
+                res = self.st.hilbert(
+                    data, output=output, dtype=np.complex64)
+                self.assertEqual(res.dtype, np.float32)
+                assert_allclose(res, exp, rtol=1e-3, atol=1e-3)
 
     def test_hilbert_input_validation(self):
         """Test hilbert raises on invalid inputs."""
         with self.assertRaises(ValueError):
-            self.st.hilbert(np.ones((4, 4)))
+            self.st.hilbert(np.ones((4, 4, 4)))
         with self.assertRaises(ValueError):
             self.st.hilbert(np.array([], dtype=float))
+        with self.assertRaises(ValueError):
+            self.st.hilbert(np.ones(4), output='amplitude')
 
 
 class TestSineTaper(unittest.TestCase):
@@ -272,6 +993,22 @@ class TestSineTaper(unittest.TestCase):
                         msg=f'dot mismatch for i={i}, j={j}'
                     )
 
+    def test_sine_tapers(self):
+        """Test the bank of sine tapers."""
+        n = 37
+        tapers = self.sine.sine_tapers(6, n)
+        expected = [self.sine.sine_taper(k, n) for k in range(6)]
+        assert_allclose(tapers, expected)
+        self.assertIs(self.sine.sine_tapers(6, n), tapers)
+        self.assertFalse(tapers.flags.writeable)
+        tapers = self.sine.sine_tapers(6, n, cache=False)
+        self.assertTrue(tapers.flags.writeable)
+        assert_allclose(tapers, expected)
+        with self.assertRaises(ValueError):
+            self.sine.sine_tapers(0, n)
+        with self.assertRaises(ValueError):
+            self.sine.sine_tapers(2, 10.5)
+
 
 if __name__ == '__main__':
     unittest.main()